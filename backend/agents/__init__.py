@@ -6,6 +6,8 @@ from .structure_architect import StructureArchitect
 from .content_enricher import ContentEnricher
 from .validator import Validator
 from .refiner import Refiner
+from .topic_refiner import TopicRefiner
+from .critique_refiner import CritiqueRefiner
 
 __all__ = [
     'BaseAgent',
@@ -14,5 +16,7 @@ __all__ = [
     'StructureArchitect',
     'ContentEnricher',
     'Validator',
-    'Refiner'
+    'Refiner',
+    'TopicRefiner',
+    'CritiqueRefiner'
 ]
\ No newline at end of file
@@ -1,12 +1,36 @@
 # backend/agents/base_agent.py
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Type
+from pydantic import BaseModel
 from services.llm_service import LLMService
-import json
+from services.budget import RequestBudget
+from services.tracing import tracer
+from services.json_repair import repair_json, validate_output, is_truncated
+import os
+
+# Follow-up calls allowed to finish a reply that hit max_tokens
+MAX_CONTINUATIONS = int(os.getenv("JSON_MAX_CONTINUATIONS", "2"))
+
+CONTINUE_PROMPT = (
+    "Your reply was cut off. Continue it from exactly where it stopped, "
+    "without repeating anything and without any commentary."
+)
 
 class BaseAgent(ABC):
     """Base class for all agents"""
     
+    # Whether an in-flight call may be aborted when the client disconnects
+    cancellable = True
+    
+    # Ask the provider for a JSON object reply
+    json_mode = True
+    
+    # Schema used to coerce and validate the parsed reply
+    output_schema: Optional[Type[BaseModel]] = None
+    
+    # Estimated input token budget for encoded roadmaps/topic listings
+    prompt_token_budget: Optional[int] = None
+    
     def __init__(self, role: str, task: str, llm_service: LLMService):
         self.role = role
         self.task = task
@@ -23,48 +47,75 @@ class BaseAgent(ABC):
         pass
     
     def _parse_response(self, response: str) -> Dict[str, Any]:
-        """Parse JSON response"""
-        try:
-            # Try direct JSON parse
-            data = json.loads(response)
-            return data
-        except json.JSONDecodeError:
-            # Try to extract JSON from markdown code blocks
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                json_str = response[start:end].strip()
-                return json.loads(json_str)
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                json_str = response[start:end].strip()
-                return json.loads(json_str)
-            else:
-                # Try to find JSON object
-                start = response.find('{')
-                end = response.rfind('}') + 1
-                if start != -1 and end != 0:
-                    return json.loads(response[start:end])
-                raise ValueError("Could not parse response as JSON")
+        """Parse a JSON reply, repairing it locally and validating it against output_schema"""
+        data, repaired = repair_json(response)
+        if repaired:
+            print(f"     {self.__class__.__name__}: repaired malformed JSON reply")
+        if self.output_schema is not None:
+            data = validate_output(self.output_schema, data)
+        return data
     
-    def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def run(
+        self,
+        input_data: Dict[str, Any],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
         """
         Execute agent
         
         Args:
             input_data: Input dictionary
+            budget: Optional per-request budget charged with token usage
         
         Returns:
             Structured output dictionary
         """
-        system_prompt = self._build_system_prompt()
-        user_prompt = self._build_user_prompt(input_data)
+        with tracer.span("agent.run", agent=self.__class__.__name__):
+            user_prompt = self._build_user_prompt(input_data)
+            
+            return self._complete(user_prompt, budget=budget)
+    
+    def _complete(
+        self,
+        user_prompt: str,
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """Send a user prompt with this agent's system prompt and parse the JSON reply"""
+        messages = [
+            {"role": "system", "content": self._build_system_prompt()},
+            {"role": "user", "content": user_prompt}
+        ]
+        options = {
+            'temperature': 0.7,
+            'budget': budget,
+            'tag': self.__class__.__name__,
+            'cancellable': self.cancellable
+        }
+        
+        response, finish_reason = self.llm.chat(messages, json_mode=self.json_mode, **options)
         
-        response = self.llm.generate(
-            prompt=user_prompt,
-            system_prompt=system_prompt,
-            temperature=0.7
-        )
+        # Request only the missing tail of a cut-off reply instead of redoing it
+        continuations = 0
+        while continuations < MAX_CONTINUATIONS and (
+            finish_reason == "length"
+            or (finish_reason == "json_validate_failed" and is_truncated(response))
+        ):
+            continuations += 1
+            print(f"     {self.__class__.__name__}: reply truncated, requesting continuation {continuations}")
+            tail, finish_reason = self.llm.chat(messages + [
+                {"role": "assistant", "content": response},
+                {"role": "user", "content": CONTINUE_PROMPT}
+            ], json_mode=False, **options)
+            response += _strip_code_fence(tail)
         
-        return self._parse_response(response)
\ No newline at end of file
+        with tracer.span("agent.parse_response", agent=self.__class__.__name__, response_chars=len(response or ''), continuations=continuations):
+            return self._parse_response(response)
+
+
+def _strip_code_fence(text: str) -> str:
+    """Drop a code fence a model may wrap around a continuation"""
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        return stripped[:-3] if stripped.endswith("```") else stripped
+    return text
@@ -1,11 +1,14 @@
 # backend/agents/content_analyzer.py
 from .base_agent import BaseAgent
+from models.agent_outputs import TopicListOutput
 from typing import Dict, Any
 
 
 class ContentAnalyzer(BaseAgent):
     """Analyzes content and extracts topics"""
     
+    output_schema = TopicListOutput
+    
     def __init__(self, llm_service):
         super().__init__(
             role="Content Analysis Expert",
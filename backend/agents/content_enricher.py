@@ -1,17 +1,31 @@
 # backend/agents/content_enricher.py
 from .base_agent import BaseAgent
-from typing import Dict, Any
+from models.agent_outputs import EnrichmentOutput
+from typing import Dict, Any, Optional
+from services.budget import RequestBudget
+from services.enrichment_library import EnrichmentLibrary
+from services.prompt_encoding import encode_topics
+from utils.helpers import normalize_name
 
 
 class ContentEnricher(BaseAgent):
     """Enriches topics with resources and project ideas"""
     
-    def __init__(self, llm_service):
+    output_schema = EnrichmentOutput
+    
+    def __init__(self, llm_service, library: Optional[EnrichmentLibrary] = None):
         super().__init__(
             role="Content Enrichment Specialist",
             task="Add resources and project ideas to topics",
             llm_service=llm_service
         )
+        self.library = library
+    
+    @property
+    def cancellable(self) -> bool:
+        # Generated enrichments are kept in the shared library, so an
+        # in-flight call is worth finishing even if its client has left
+        return self.library is None
     
     def _build_system_prompt(self) -> str:
         return """You are an expert at enriching educational content with practical resources and projects.
@@ -27,13 +41,12 @@ Always respond in valid JSON format."""
     def _build_user_prompt(self, input_data: Dict[str, Any]) -> str:
         topics = input_data.get('topics', [])
         
-        topics_str = "\n\n".join([
-            f"Topic: {topic['topic']}\n"
-            f"Description: {topic['description']}\n"
-            f"Difficulty: {topic['difficulty_label']}\n"
-            f"Concepts: {', '.join(topic['concepts'])}"
-            for topic in topics
-        ])
+        topics_str = encode_topics(
+            topics,
+            columns=['topic', 'difficulty_label', 'concepts', 'description'],
+            max_tokens=self.prompt_token_budget,
+            label=self.__class__.__name__
+        )
         
         return f"""For each topic below, suggest resources and project ideas.
 
@@ -75,4 +88,36 @@ Return ONLY a JSON object with this structure:
   ]
 }}"""
     
-   
\ No newline at end of file
+    def run(
+        self,
+        input_data: Dict[str, Any],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """Enrich topics, sending only topics missing from the library to the LLM"""
+        if self.library is None:
+            return super().run(input_data, budget=budget)
+        
+        cached = []
+        missing = []
+        for topic in input_data.get('topics', []):
+            entry = self.library.lookup(topic)
+            if entry is not None:
+                cached.append(entry)
+            else:
+                missing.append(topic)
+        
+        print(f"   Enrichment library: {len(cached)} cached, {len(missing)} to generate")
+        if not missing:
+            return {'enriched_topics': cached}
+        
+        result = super().run({**input_data, 'topics': missing}, budget=budget)
+        generated = result.get('enriched_topics', [])
+        
+        generated_by_name = {normalize_name(et.get('topic', '')): et for et in generated}
+        self.library.store_many([
+            (topic, generated_by_name[normalize_name(topic['topic'])])
+            for topic in missing
+            if normalize_name(topic['topic']) in generated_by_name
+        ])
+        
+        return {'enriched_topics': cached + generated}
@@ -0,0 +1,129 @@
+# backend/agents/critique_refiner.py
+from .base_agent import BaseAgent
+from models.agent_outputs import ScoreOutput
+from typing import Dict, Any, List, Optional
+from models.serialization import dumps_compact
+from services.prompt_encoding import encode_roadmap
+from services.budget import RequestBudget
+
+
+class CritiqueRefiner(BaseAgent):
+    """Scores a roadmap and proposes concrete fixes in a single completion"""
+
+    output_schema = ScoreOutput
+
+    def __init__(self, llm_service):
+        super().__init__(
+            role="Roadmap Critic and Editor",
+            task="Score roadmap quality and propose targeted fixes",
+            llm_service=llm_service
+        )
+
+    def _build_system_prompt(self) -> str:
+        return """You are a quality assurance expert and editor for educational roadmaps.
+Your job is to score a roadmap and, in the same answer, propose the exact edits that fix its problems.
+
+You check for:
+- Logical flow and progression
+- Appropriate difficulty scaling
+- Complete prerequisite coverage
+- Realistic time estimates
+- Quality of descriptions, resources and projects
+
+Your fixes are concrete field values, never instructions.
+
+Always respond in valid JSON format."""
+
+    def _build_user_prompt(self, input_data: Dict[str, Any]) -> str:
+        roadmap = input_data.get('roadmap', {})
+
+        roadmap_str = encode_roadmap(roadmap, self.prompt_token_budget, label=self.__class__.__name__)
+
+        return f"""Evaluate this learning roadmap, score it and propose fixes.
+
+ROADMAP:
+{roadmap_str}
+
+Score these aspects:
+1. Logical Flow: Does the learning path make sense? (20 points)
+2. Prerequisites: Are all prerequisites properly identified? (20 points)
+3. Difficulty Progression: Does difficulty increase appropriately? (15 points)
+4. Completeness: Are all necessary topics covered? (15 points)
+5. Time Estimates: Are time estimates realistic? (10 points)
+6. Content Quality: Are descriptions and concepts clear? (10 points)
+7. Practical Value: Are project ideas and resources useful? (10 points)
+
+Then fix the issues you found:
+- In "topic_fixes", give the NEW values of only the fields that must change, keyed by topic id.
+  Allowed fields: description, difficulty_label, category, time_estimate, concepts,
+  prerequisites, resources, project_ideas
+- In "roadmap_fixes", give new values for overview, total_time_estimate or learning_path
+  only if they must change
+- Leave both empty if the roadmap passes
+
+Return ONLY a JSON object with this structure:
+{{
+  "score": 78,
+  "passed": false,
+  "feedback": ["Issue 1", "Issue 2"],
+  "topic_fixes": {{
+    "topic_3": {{
+      "time_estimate": "1 week",
+      "prerequisites": ["Topic Name"]
+    }}
+  }},
+  "roadmap_fixes": {{
+    "total_time_estimate": "8-10 weeks"
+  }}
+}}
+
+Score threshold for passing: 85/100"""
+
+    def rescore(
+        self,
+        previous_score: int,
+        feedback: List[str],
+        changed_topics: List[Dict[str, Any]],
+        roadmap_fixes: Dict[str, Any],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """
+        Confirm the score after fixes were applied
+
+        Only the previous verdict and the edited parts are sent, so this is
+        much cheaper than a full validation.
+        """
+        return self._complete(
+            self._build_rescore_prompt(previous_score, feedback, changed_topics, roadmap_fixes),
+            budget=budget
+        )
+
+    def _build_rescore_prompt(
+        self,
+        previous_score: int,
+        feedback: List[str],
+        changed_topics: List[Dict[str, Any]],
+        roadmap_fixes: Dict[str, Any]
+    ) -> str:
+        feedback_str = "\n".join([f"- {f}" for f in feedback]) or "- none"
+
+        return f"""A roadmap scored {previous_score}/100 with these issues:
+{feedback_str}
+
+These edits were applied to address them.
+
+EDITED TOPICS:
+{dumps_compact(changed_topics)}
+
+EDITED ROADMAP FIELDS:
+{dumps_compact(roadmap_fixes)}
+
+Assume everything else is unchanged. Estimate the new score.
+
+Return ONLY a JSON object with this structure:
+{{
+  "score": 88,
+  "passed": true
+}}
+
+Score threshold for passing: 85/100"""
@@ -1,17 +1,31 @@
 # backend/agents/prerequisite_detector.py
 from .base_agent import BaseAgent
-from typing import Dict, Any
+from models.agent_outputs import PrerequisiteOutput
+from typing import Dict, Any, List, Optional
+from services.budget import RequestBudget
+from utils.helpers import run_parallel, normalize_name, jaccard, topological_order
 
 
 class PrerequisiteDetector(BaseAgent):
     """Detects prerequisites and dependencies between topics"""
     
-    def __init__(self, llm_service):
+    output_schema = PrerequisiteOutput
+    
+    def __init__(
+        self,
+        llm_service,
+        hierarchical_threshold: int = 60,
+        module_size: int = 25,
+        max_workers: int = 4
+    ):
         super().__init__(
             role="Learning Path Expert",
             task="Identify prerequisites and learning dependencies",
             llm_service=llm_service
         )
+        self.hierarchical_threshold = hierarchical_threshold
+        self.module_size = module_size
+        self.max_workers = max_workers
     
     def _build_system_prompt(self) -> str:
         return """You are an expert in learning paths and educational sequencing.
@@ -59,4 +73,216 @@ Return ONLY a JSON object with this structure:
 
 The learning_path should be an ordered list from foundational to advanced topics."""
     
-    
\ No newline at end of file
+    def run(
+        self,
+        input_data: Dict[str, Any],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """Detect prerequisites, switching to hierarchical mode for large topic sets"""
+        topics = input_data.get('topics', [])
+        if len(topics) <= self.hierarchical_threshold:
+            return super().run(input_data, budget=budget)
+        return self._run_hierarchical(topics, budget)
+    
+    def _run_hierarchical(
+        self,
+        topics: List[Dict[str, Any]],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """
+        Cluster topics into modules, detect intra-module prerequisites in
+        parallel, order modules with one small call and stitch the graph
+        """
+        modules = self._cluster_topics(topics)
+        module_ids = [f"module_{i}" for i in range(1, len(modules) + 1)]
+        print(f"   Hierarchical mode: {len(topics)} topics in {len(modules)} modules")
+        
+        # Intra-module prerequisites, one call per module
+        def detect(module: List[Dict[str, Any]]) -> Dict[str, Any]:
+            return BaseAgent.run(self, {'topics': module}, budget=budget)
+        
+        module_results = run_parallel(detect, modules, self.max_workers)
+        
+        prerequisites: Dict[str, List[str]] = {}
+        module_paths: Dict[str, List[str]] = {}
+        for module_id, module, result in zip(module_ids, modules, module_results):
+            names = [topic['topic'] for topic in module]
+            known = set(names)
+            if isinstance(result, Exception):
+                print(f"     Prerequisite detection failed for {module_id}: {result}")
+                result = {}
+            
+            module_prereqs = result.get('prerequisites', {})
+            for name in names:
+                prerequisites[name] = [p for p in module_prereqs.get(name, []) if p in known and p != name]
+            
+            path = [name for name in result.get('learning_path', []) if name in known]
+            module_paths[module_id] = topological_order(
+                list(dict.fromkeys(path + names)), prerequisites
+            )
+        
+        # Inter-module ordering
+        try:
+            module_result = self._complete(self._build_module_prompt(module_ids, modules), budget=budget)
+        except Exception as e:
+            print(f"     Module ordering failed: {e}")
+            module_result = {}
+        
+        known_modules = set(module_ids)
+        module_prereqs = {
+            module_id: [m for m in module_result.get('module_prerequisites', {}).get(module_id, [])
+                        if m in known_modules and m != module_id]
+            for module_id in module_ids
+        }
+        suggested_order = [m for m in module_result.get('module_order', []) if m in known_modules]
+        if not suggested_order:
+            mean_difficulty = {
+                module_id: sum(_difficulty(t) for t in module) / len(module)
+                for module_id, module in zip(module_ids, modules)
+            }
+            suggested_order = sorted(module_ids, key=mean_difficulty.get)
+        module_order = topological_order(list(dict.fromkeys(suggested_order + module_ids)), module_prereqs)
+        
+        # Stitch: entry topics of a module depend on the exit topics of its prerequisite modules
+        for module_id in module_ids:
+            path = module_paths[module_id]
+            entry_topics = [name for name in path if not prerequisites[name]]
+            for prereq_module in module_prereqs[module_id]:
+                prereq_path = module_paths[prereq_module]
+                used = {p for name in prereq_path for p in prerequisites[name]}
+                exit_topics = [name for name in prereq_path if name not in used][-2:]
+                for name in entry_topics:
+                    prerequisites[name].extend(p for p in exit_topics if p not in prerequisites[name])
+        
+        return {
+            'prerequisites': prerequisites,
+            'learning_path': [name for module_id in module_order for name in module_paths[module_id]],
+            'modules': {module_id: module_paths[module_id] for module_id in module_order}
+        }
+    
+    def detect_for_new(
+        self,
+        new_topics: List[Dict[str, Any]],
+        existing_topics: List[Dict[str, Any]],
+        budget: Optional[RequestBudget] = None
+    ) -> Dict[str, Any]:
+        """
+        Detect edges touching newly added topics only
+        
+        Existing topics are listed by name so the model can link to them,
+        but the output only covers the new topics, keeping it proportional
+        to the edit rather than to the roadmap.
+        
+        Returns:
+            {"prerequisites": {new_topic: [...]}, "dependents": {new_topic: [existing_topic, ...]}}
+        """
+        new_names = {topic['topic'] for topic in new_topics}
+        known = new_names | {topic['topic'] for topic in existing_topics}
+        
+        result = self._complete(self._build_new_topics_prompt(new_topics, existing_topics), budget=budget)
+        
+        return {
+            'prerequisites': {
+                name: [p for p in result.get('prerequisites', {}).get(name, []) if p in known and p != name]
+                for name in new_names
+            },
+            'dependents': {
+                name: [d for d in result.get('dependents', {}).get(name, []) if d in known - new_names]
+                for name in new_names
+            }
+        }
+    
+    def _build_new_topics_prompt(
+        self,
+        new_topics: List[Dict[str, Any]],
+        existing_topics: List[Dict[str, Any]]
+    ) -> str:
+        new_str = "\n".join([
+            f"- {topic['topic']} (Difficulty: {topic.get('difficulty', 'N/A')}, Category: {topic.get('category', 'N/A')})"
+            for topic in new_topics
+        ])
+        existing_str = "\n".join([f"- {topic['topic']}" for topic in existing_topics]) or "none"
+        
+        return f"""New topics were added to an existing learning roadmap.
+
+EXISTING TOPICS:
+{existing_str}
+
+NEW TOPICS:
+{new_str}
+
+For each NEW topic determine:
+1. prerequisites: topics (new or existing) that must be learned BEFORE it
+2. dependents: EXISTING topics that should now be learned AFTER it
+
+Return ONLY a JSON object with this structure:
+{{
+  "prerequisites": {{
+    "New Topic": ["prerequisite1"]
+  }},
+  "dependents": {{
+    "New Topic": ["Existing Topic"]
+  }}
+}}"""
+    
+    def _cluster_topics(self, topics: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group topics by category, merge small groups by concept overlap, split large ones"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for topic in topics:
+            groups.setdefault(normalize_name(topic.get('category') or 'general'), []).append(topic)
+        
+        min_size = max(2, self.module_size // 4)
+        merged: List[List[Dict[str, Any]]] = []
+        for group in sorted(groups.values(), key=len, reverse=True):
+            if len(group) >= min_size or not merged:
+                merged.append(group)
+                continue
+            concepts = _concept_set(group)
+            target = max(merged, key=lambda module: jaccard(concepts, _concept_set(module)))
+            target.extend(group)
+        
+        modules = []
+        for module in merged:
+            if len(module) <= self.module_size:
+                modules.append(module)
+                continue
+            ordered = sorted(module, key=_difficulty)
+            for start in range(0, len(ordered), self.module_size):
+                modules.append(ordered[start:start + self.module_size])
+        return modules
+    
+    def _build_module_prompt(self, module_ids: List[str], modules: List[List[Dict[str, Any]]]) -> str:
+        modules_str = "\n".join([
+            f"- {module_id}: {module[0].get('category', 'general')} "
+            f"(difficulty {min(_difficulty(t) for t in module)}-{max(_difficulty(t) for t in module)}): "
+            f"{', '.join(t['topic'] for t in module[:5])}"
+            f"{f' (+{len(module) - 5} more)' if len(module) > 5 else ''}"
+            for module_id, module in zip(module_ids, modules)
+        ])
+        
+        return f"""Given these modules of related topics, determine the order in which they should be learned.
+
+MODULES:
+{modules_str}
+
+For each module, list the modules that must be learned BEFORE it.
+
+Return ONLY a JSON object with this structure:
+{{
+  "module_prerequisites": {{
+    "module_2": ["module_1"],
+    "module_1": []
+  }},
+  "module_order": ["module_1", "module_2", ...]
+}}"""
+
+
+def _difficulty(topic: Dict[str, Any]) -> int:
+    try:
+        return int(topic.get('difficulty', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _concept_set(topics: List[Dict[str, Any]]) -> set:
+    return {normalize_name(c) for topic in topics for c in topic.get('concepts', [])}
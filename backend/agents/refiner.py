@@ -1,11 +1,14 @@
 # backend/agents/refiner.py
 from .base_agent import BaseAgent
+from models.agent_outputs import RoadmapOutput
 from typing import Dict, Any
-import json
+from services.prompt_encoding import encode_roadmap
 
 class Refiner(BaseAgent):
     """Refines roadmap based on validation feedback"""
     
+    output_schema = RoadmapOutput
+    
     def __init__(self, llm_service):
         super().__init__(
             role="Roadmap Refinement Specialist",
@@ -36,7 +39,7 @@ Always respond in valid JSON format with the improved roadmap."""
         feedback_str = "\n".join([f"- {f}" for f in feedback])
         suggestions_str = "\n".join([f"- {s}" for s in suggestions])
         
-        roadmap_str = json.dumps(roadmap, indent=2)
+        roadmap_str = encode_roadmap(roadmap, self.prompt_token_budget, label=self.__class__.__name__)
         
         return f"""Refine this roadmap based on the validation feedback.
 
@@ -65,12 +68,28 @@ Think step by step:
 3. Make those changes to the roadmap
 4. Ensure all suggestions are addressed
 
-Return ONLY a JSON object with the improved roadmap using the EXACT same structure:
+Return ONLY a JSON object with the improved roadmap:
 {{
   "title": "...",
   "overview": "...",
   "total_time_estimate": "...",
-  "topics": [...]
-}}"""
+  "topics": [
+    {{
+      "id": "topic_1",
+      "topic": "Topic Name",
+      "description": "...",
+      "difficulty_label": "beginner",
+      "category": "...",
+      "time_estimate": "...",
+      "concepts": ["..."],
+      "prerequisites": ["Prerequisite Topic Name"],
+      "resources": [{{"type": "...", "title": "...", "description": "..."}}],
+      "project_ideas": ["..."]
+    }}
+  ]
+}}
+
+Keep every topic id. Fields shown shortened (ending in …) may be left out
+and are then kept as they are."""
     
     
\ No newline at end of file
@@ -1,11 +1,15 @@
 # backend/agents/structure_architect.py
 from .base_agent import BaseAgent
+from models.agent_outputs import RoadmapOutput
 from typing import Dict, Any
+from services.prompt_encoding import encode_topics
 
 
 class StructureArchitect(BaseAgent):
     """Creates optimal roadmap structure with time estimates"""
     
+    output_schema = RoadmapOutput
+    
     def __init__(self, llm_service):
         super().__init__(
             role="Roadmap Structure Expert",
@@ -30,10 +34,13 @@ Always respond in valid JSON format."""
         prerequisites = input_data.get('prerequisites', {})
         learning_path = input_data.get('learning_path', [])
         
-        topics_str = "\n".join([
-            f"- {topic['topic']} | Difficulty: {topic['difficulty']} | Concepts: {', '.join(topic['concepts'][:3])}"
-            for topic in topics
-        ])
+        topics_str = encode_topics(
+            topics,
+            columns=['topic', 'difficulty', 'concepts'],
+            max_tokens=self.prompt_token_budget,
+            label=self.__class__.__name__,
+            max_concepts=3
+        )
         
         return f"""Create a structured roadmap with time estimates for these topics.
 
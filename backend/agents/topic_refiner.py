@@ -0,0 +1,68 @@
+# backend/agents/topic_refiner.py
+from .base_agent import BaseAgent
+from models.agent_outputs import RefinedTopicOutput
+from typing import Dict, Any
+from models.serialization import dumps_compact
+
+
+class TopicRefiner(BaseAgent):
+    """Refines a single topic based on topic-specific validation feedback"""
+    
+    output_schema = RefinedTopicOutput
+
+    def __init__(self, llm_service):
+        super().__init__(
+            role="Topic Refinement Specialist",
+            task="Improve a single roadmap topic based on feedback",
+            llm_service=llm_service
+        )
+
+    def _build_system_prompt(self) -> str:
+        return """You are an expert at refining individual topics of educational roadmaps.
+Your job is to fix the specific issues reported for one topic without changing its identity.
+
+You:
+- Address every issue listed for the topic
+- Keep the topic id and name unchanged
+- Only reference prerequisites that exist in the roadmap
+
+Always respond in valid JSON format with the improved topic."""
+
+    def _build_user_prompt(self, input_data: Dict[str, Any]) -> str:
+        topic = input_data.get('topic', {})
+        issues = input_data.get('issues', [])
+        roadmap_title = input_data.get('roadmap_title', '')
+        prerequisites = input_data.get('prerequisites', [])
+
+        issues_str = "\n".join([f"- {issue}" for issue in issues])
+        prerequisites_str = ", ".join(prerequisites) or "none"
+
+        return f"""Refine this topic from the roadmap "{roadmap_title}".
+
+CURRENT TOPIC:
+{dumps_compact(topic)}
+
+PREREQUISITE TOPICS IN THE ROADMAP:
+{prerequisites_str}
+
+ISSUES TO FIX:
+{issues_str}
+
+Think step by step:
+1. Review each issue
+2. Decide which fields need to change
+3. Update only those fields
+
+Return ONLY a JSON object with the improved topic using the EXACT same fields:
+{{
+  "id": "{topic.get('id', '')}",
+  "topic": "{topic.get('topic', '')}",
+  "description": "...",
+  "difficulty_label": "...",
+  "category": "...",
+  "time_estimate": "...",
+  "concepts": [...],
+  "prerequisites": [...],
+  "resources": [...],
+  "project_ideas": [...]
+}}"""
@@ -1,11 +1,14 @@
 # backend/agents/validator.py
 from .base_agent import BaseAgent
+from models.agent_outputs import ScoreOutput
 from typing import Dict, Any
-import json
+from services.prompt_encoding import encode_roadmap
 
 class Validator(BaseAgent):
     """Validates roadmap quality and provides feedback"""
     
+    output_schema = ScoreOutput
+    
     def __init__(self, llm_service):
         super().__init__(
             role="Quality Assurance Expert",
@@ -32,7 +35,7 @@ Always respond in valid JSON format."""
     def _build_user_prompt(self, input_data: Dict[str, Any]) -> str:
         roadmap = input_data.get('roadmap', {})
         
-        roadmap_str = json.dumps(roadmap, indent=2)
+        roadmap_str = encode_roadmap(roadmap, self.prompt_token_budget, label=self.__class__.__name__)
         
         return f"""Evaluate this learning roadmap and provide a quality score with feedback.
 
@@ -51,21 +54,29 @@ Evaluate these aspects:
 Think step by step:
 1. Review each aspect carefully
 2. Identify specific issues or missing elements
-3. Provide concrete suggestions for improvement
-4. Calculate total score
+3. Attribute every issue that concerns specific topics to those topic ids
+4. Provide concrete suggestions for improvement
+5. Calculate total score
+
+Put issues that affect the roadmap as a whole (ordering, missing topics, overall
+time) in "feedback". Put issues tied to individual topics in "topic_issues",
+keyed by topic id. Leave "feedback" empty if every issue is tied to a topic.
 
 Return ONLY a JSON object with this structure:
 {{
   "score": 85,
   "passed": true,
   "feedback": [
-    "Issue or observation 1",
-    "Issue or observation 2"
+    "Roadmap-wide issue 1",
+    "Roadmap-wide issue 2"
   ],
   "suggestions": [
     "Specific suggestion for improvement 1",
     "Specific suggestion for improvement 2"
-  ]
+  ],
+  "topic_issues": {{
+    "topic_3": ["Issue specific to topic_3"]
+  }}
 }}
 
 Score threshold for passing: 85/100"""
@@ -0,0 +1,55 @@
+# backend/benchmarks/bench_prompt_encoding.py
+"""
+Prompt size benchmark for roadmap-carrying agents
+
+Reports estimated input tokens of the roadmap section of the Validator /
+Refiner prompt as indent=2 JSON, minified JSON and the compact table
+encoding under several budgets, and checks that every encoding still
+carries every topic id and prerequisite edge.
+
+Usage:
+    python -m benchmarks.bench_prompt_encoding [--budgets 0 6000 2000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_serialization import make_roadmap
+from models.serialization import dumps_compact
+from services.prompt_encoding import encode_roadmap, estimate_tokens, _missing_ids_and_edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', type=int, nargs='+', default=[0, 6000, 2000], help="0 means no budget")
+    args = parser.parse_args()
+
+    print(f"{'topics':>7} {'indent=2':>10} {'minified':>10} " + " ".join(f"{f'budget {b or None}':>14}" for b in args.budgets))
+    failures = 0
+    for n_topics in (10, 100, 1000):
+        roadmap = make_roadmap(n_topics)
+        cells = []
+        for budget in args.budgets:
+            with contextlib.redirect_stdout(io.StringIO()):
+                text = encode_roadmap(roadmap, budget or None)
+            missing = _missing_ids_and_edges(text, roadmap)
+            failures += bool(missing)
+            cells.append(f"{estimate_tokens(text):>13}{'!' if missing else ' '}")
+        print(
+            f"{n_topics:>7} {estimate_tokens(json.dumps(roadmap, indent=2)):>10} "
+            f"{estimate_tokens(dumps_compact(roadmap)):>10} " + " ".join(cells)
+        )
+
+    if failures:
+        print(f"{failures} encodings lost topic ids or edges (marked !)")
+        sys.exit(1)
+    print("Every encoding carries every topic id and prerequisite edge")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# backend/benchmarks/bench_serialization.py
+"""
+Microbenchmark for the roadmap serialization path
+
+Compares per-request CPU time of the legacy path (indent=2 prompt dumps for
+Validator and Refiner on every iteration, full RoadmapResponse validation,
+json.dumps of the result) with the precompiled TypeAdapter path.
+
+Usage:
+    python -m benchmarks.bench_serialization [--iterations 3] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.schemas import RoadmapResponse
+from models.serialization import dumps_compact, build_response, response_to_json
+
+
+def make_roadmap(n_topics: int) -> Dict[str, Any]:
+    """Build a synthetic roadmap with n_topics fully enriched topics"""
+    topics = []
+    for i in range(1, n_topics + 1):
+        topics.append({
+            'id': f'topic_{i}',
+            'topic': f'Topic {i}',
+            'description': f'Description of topic {i} covering several related ideas.',
+            'difficulty_label': ['beginner', 'intermediate', 'advanced', 'expert'][i % 4],
+            'category': 'core concepts',
+            'time_estimate': '3-4 hours',
+            'concepts': [f'concept_{i}_{j}' for j in range(5)],
+            'prerequisites': [f'Topic {j}' for j in range(max(1, i - 2), i)],
+            'resources': [
+                {'type': 'tutorial', 'title': f'Resource {i}.{j}', 'description': 'A useful resource.'}
+                for j in range(3)
+            ],
+            'project_ideas': [f'Project {i}.{j}' for j in range(3)]
+        })
+
+    return {
+        'title': 'Benchmark Roadmap',
+        'overview': 'Synthetic roadmap used for serialization benchmarks.',
+        'total_time_estimate': '8 weeks',
+        'topics': topics,
+        'dependencies': {t['topic']: t['prerequisites'] for t in topics},
+        'learning_path': [t['topic'] for t in topics]
+    }
+
+
+def legacy_request(roadmap: Dict[str, Any], iterations: int) -> bytes:
+    """Serialization work done per request before the fast path"""
+    for _ in range(iterations):
+        json.dumps(roadmap, indent=2)  # Validator prompt
+        json.dumps(roadmap, indent=2)  # Refiner prompt
+    response = RoadmapResponse(
+        success=True,
+        roadmap=roadmap,
+        validation_score=90,
+        iterations=iterations
+    )
+    return json.dumps(response.model_dump(mode='json')).encode('utf-8')
+
+
+def fast_request(roadmap: Dict[str, Any], iterations: int) -> bytes:
+    """Serialization work done per request with the fast path"""
+    for _ in range(iterations):
+        dumps_compact(roadmap)  # shared by Validator and Refiner
+    response = build_response(roadmap, validation_score=90, iterations=iterations)
+    return response_to_json(response)
+
+
+def measure(fn: Callable, roadmap: Dict[str, Any], iterations: int, repeat: int) -> float:
+    """Return mean CPU milliseconds per request"""
+    fn(roadmap, iterations)  # warm-up
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(roadmap, iterations)
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roadmap serialization microbenchmark")
+    parser.add_argument('--iterations', type=int, default=3, help="Refinement iterations per request")
+    parser.add_argument('--repeat', type=int, default=20, help="Requests measured per size")
+    args = parser.parse_args()
+
+    print(f"{'topics':>8} {'legacy ms':>12} {'fast ms':>12} {'speedup':>9}")
+    for n_topics in (10, 100, 1000):
+        roadmap = make_roadmap(n_topics)
+        legacy_ms = measure(legacy_request, roadmap, args.iterations, args.repeat)
+        fast_ms = measure(fast_request, roadmap, args.iterations, args.repeat)
+        speedup = legacy_ms / fast_ms if fast_ms else float('inf')
+        print(f"{n_topics:>8} {legacy_ms:>12.2f} {fast_ms:>12.2f} {speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# backend/bulk_generate.py
+"""
+Offline bulk roadmap generation
+
+Generates roadmaps for every document in a directory or JSONL manifest and
+appends one NDJSON record per document to the output file. Re-running the
+same command resumes: documents that already have a record (ok or error) are
+skipped; pass --retry-failed to run the ones with an error record again.
+
+Usage:
+    python bulk_generate.py catalog/ -o roadmaps.ndjson --processes 4 --concurrency 2 --rpm 120
+    python bulk_generate.py manifest.jsonl -o roadmaps.ndjson
+
+Manifest lines look like {"id": "course-1", "path": "syllabus.pdf"} or
+{"id": "course-2", "text": "..."}; relative paths resolve against the
+manifest's directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set
+
+from models.schemas import GenerationProfile
+from models.serialization import dumps_compact
+from services.rate_limit import SharedRateLimiter
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+
+def load_jobs(source: str) -> List[Dict[str, Any]]:
+    """Build the job list from a directory or a JSONL manifest"""
+    if os.path.isdir(source):
+        jobs = []
+        for root, _, filenames in os.walk(source):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    jobs.append({'id': os.path.relpath(path, source), 'path': path})
+        return sorted(jobs, key=lambda job: job['id'])
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    jobs = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'path' in entry and not os.path.isabs(entry['path']):
+                entry['path'] = os.path.join(base_dir, entry['path'])
+            entry.setdefault('id', entry.get('path') or f"line-{line_number}")
+            jobs.append(entry)
+    return jobs
+
+
+def load_completed(output: str, retry_failed: bool) -> Set[str]:
+    """Return ids already present in the output (ignoring a torn last line)"""
+    completed = set()
+    if not os.path.exists(output):
+        return completed
+    with open(output, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'ok' or not retry_failed:
+                completed.add(record.get('id'))
+    return completed
+
+
+def _process_job(orchestrator, doc_processor, job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.monotonic()
+    record = {'id': job['id'], 'source': job.get('path')}
+    try:
+        if 'text' in job:
+            text = job['text']
+        else:
+            with open(job['path'], 'rb') as f:
+                text = doc_processor.process_file(f.read(), os.path.splitext(job['path'])[1])
+
+        if not text or len(text.strip()) < 50:
+            raise ValueError("Could not extract sufficient text from document")
+
+        result = orchestrator.generate_roadmap(
+            text,
+            profile=options['profile'],
+            deadline_seconds=options['deadline_seconds'],
+            max_tokens=options['max_tokens']
+        )
+        record.update(
+            status='ok',
+            roadmap=result['roadmap'],
+            validation_score=result['validation_score'],
+            iterations=result['iterations'],
+            tokens_used=result.get('tokens_used')
+        )
+    except Exception as e:
+        record.update(status='error', error=str(e))
+
+    record['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return record
+
+
+def _worker(job_queue, result_queue, rate_limiter: Optional[SharedRateLimiter], options: Dict[str, Any], index: int):
+    """Worker process: one orchestrator shared by `concurrency` threads"""
+    # Agents print progress; keep worker output to the parent's stats line
+    sys.stdout = open(os.devnull, 'w')
+
+    from orchestrator import RoadmapOrchestrator
+    from services import DocumentProcessor
+
+    orchestrator = RoadmapOrchestrator()
+    orchestrator.llm_service.rate_limiter = rate_limiter
+    # Library saves aren't safe across processes, so only the first worker writes the file
+    if orchestrator.enrichment_library is not None and index > 0:
+        orchestrator.enrichment_library.persist = False
+    doc_processor = DocumentProcessor()
+
+    def consume():
+        while True:
+            job = job_queue.get()
+            if job is None:
+                return
+            result_queue.put(_process_job(orchestrator, doc_processor, job, options))
+
+    with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+        for _ in range(options['concurrency']):
+            executor.submit(consume)
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def run(args) -> int:
+    jobs = load_jobs(args.input)
+    completed = load_completed(args.output, args.retry_failed)
+    pending = [job for job in jobs if job['id'] not in completed]
+    print(f"{len(jobs)} documents, {len(jobs) - len(pending)} already done, {len(pending)} to generate")
+    if not pending:
+        return 0
+
+    options = {
+        'profile': GenerationProfile(args.profile),
+        'deadline_seconds': args.deadline_seconds,
+        'max_tokens': args.max_tokens,
+        'concurrency': args.concurrency
+    }
+    rate_limiter = SharedRateLimiter(args.rpm) if args.rpm else None
+
+    job_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for job in pending:
+        job_queue.put(job)
+    for _ in range(args.processes * args.concurrency):
+        job_queue.put(None)
+
+    workers = [
+        multiprocessing.Process(target=_worker, args=(job_queue, result_queue, rate_limiter, options, index), daemon=True)
+        for index in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Start on a fresh line if a crash left a torn record behind
+    needs_newline = False
+    if os.path.exists(args.output) and os.path.getsize(args.output) > 0:
+        with open(args.output, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+
+    started = time.monotonic()
+    done = failed = 0
+    with open(args.output, 'a', encoding='utf-8') as out:
+        if needs_newline:
+            out.write("\n")
+        while done < len(pending):
+            try:
+                record = result_queue.get(timeout=5)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    print("All workers exited before finishing; re-run to resume")
+                    break
+                continue
+
+            # One durable line per document is what makes resuming safe
+            out.write(dumps_compact(record) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+            done += 1
+            failed += record['status'] != 'ok'
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0.0
+            eta = (len(pending) - done) / rate if rate else 0.0
+            print(
+                f"[{done}/{len(pending)}] {record['status']:5} {record['id']} "
+                f"({record['elapsed_seconds']:.1f}s) | {rate * 60:.1f} docs/min | "
+                f"ETA {_format_duration(eta)} | {failed} failed"
+            )
+
+    for worker in workers:
+        worker.join(timeout=1)
+
+    print(f"Finished {done} documents in {_format_duration(time.monotonic() - started)}, {failed} failed")
+    return 1 if failed or done < len(pending) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate roadmaps for a directory or JSONL manifest of documents")
+    parser.add_argument('input', help="Directory of PDF/DOCX/TXT files or a JSONL manifest")
+    parser.add_argument('-o', '--output', default='roadmaps.ndjson', help="NDJSON output file (appended to)")
+    parser.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Worker processes")
+    parser.add_argument('--concurrency', type=int, default=2, help="Concurrent documents per process")
+    parser.add_argument('--rpm', type=float, default=None, help="LLM requests per minute shared by all workers")
+    parser.add_argument('--profile', choices=[p.value for p in GenerationProfile], default=GenerationProfile.QUALITY.value)
+    parser.add_argument('--deadline-seconds', type=float, default=None, help="Per-document deadline")
+    parser.add_argument('--max-tokens', type=int, default=None, help="Per-document token budget")
+    parser.add_argument('--retry-failed', action='store_true', help="Regenerate documents whose last record is an error")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 # backend/main.py
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any, Tuple, List
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import threading
 import uvicorn
 
 from orchestrator import RoadmapOrchestrator
-from services import DocumentProcessor
-from models.schemas import RoadmapRequest, RoadmapResponse
+from services import DocumentProcessor, AdmissionController, AdmissionRejected, RequestCancelled
+from models.schemas import RoadmapRequest, RoadmapResponse, GenerationProfile, RequestPriority
+from models.serialization import build_response, response_to_json
+from services.tracing import tracer, profile_report, Span
 
 app = FastAPI(
     title="AI Roadmap Generator",
@@ -28,6 +35,103 @@ app.add_middleware(
 # Initialize orchestrator
 orchestrator = RoadmapOrchestrator()
 doc_processor = DocumentProcessor()
+corpus_max_files = int(os.getenv("CORPUS_MAX_FILES", "50"))
+disconnect_poll_seconds = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "4")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+    max_wait_seconds={
+        RequestPriority.INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT", "10")),
+        RequestPriority.BULK: float(os.getenv("ADMISSION_BULK_MAX_WAIT", "120"))
+    }
+)
+
+async def admit(priority: RequestPriority = Query(RequestPriority.INTERACTIVE)):
+    """Hold a pipeline slot for the whole request, or shed it with 429/503"""
+    try:
+        async with admission.slot(priority):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@asynccontextmanager
+async def _cancel_on_disconnect(http_request: Request):
+    """Yield an event that is set if the client disconnects mid-request"""
+    cancel_event = threading.Event()
+    
+    async def watch():
+        while not await http_request.is_disconnected():
+            await asyncio.sleep(disconnect_poll_seconds)
+        print("Client disconnected, cancelling request")
+        cancel_event.set()
+    
+    watcher = asyncio.create_task(watch())
+    try:
+        yield cancel_event
+    finally:
+        watcher.cancel()
+
+def _cancelled_response() -> Response:
+    """Nobody is listening; 499 only shows up in access logs"""
+    return Response(status_code=499)
+
+def _roadmap_response(
+    result: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None
+) -> Tuple[RoadmapResponse, bytes]:
+    """Validate the roadmap once and render it with the fast serializer"""
+    with tracer.span("serialize"):
+        return _serialize_result(result, error)
+
+def _serialize_result(
+    result: Optional[Dict[str, Any]],
+    error: Optional[str]
+) -> Tuple[RoadmapResponse, bytes]:
+    if error is None:
+        try:
+            response = build_response(
+                roadmap=result['roadmap'],
+                validation_score=result['validation_score'],
+                iterations=result['iterations'],
+                version=result.get('version')
+            )
+        except Exception as e:
+            error = str(e)
+    
+    if error is not None:
+        response = build_response(
+            roadmap=None,
+            validation_score=0,
+            iterations=0,
+            error=error
+        )
+    
+    return response, response_to_json(response)
+
+def _file_type(filename: str) -> str:
+    """Map an upload's filename to a DocumentProcessor file type"""
+    filename = filename.lower()
+    if filename.endswith('.pdf'):
+        return 'pdf'
+    elif filename.endswith('.docx'):
+        return 'docx'
+    elif filename.endswith('.txt'):
+        return 'txt'
+    raise HTTPException(
+        status_code=400,
+        detail="Unsupported file type. Please upload PDF, DOCX, or TXT file."
+    )
+
+def _render(response: RoadmapResponse, body: bytes, root: Optional[Span] = None) -> Response:
+    """Return the rendered body, attaching the stage timeline in profile mode"""
+    if root is not None:
+        response.profile = profile_report(root)
+        body = response_to_json(response)
+    return Response(content=body, media_type="application/json")
 
 @app.get("/")
 async def root():
@@ -36,8 +140,12 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "stats": "/stats",
             "generate_from_text": "/generate-roadmap/text",
-            "generate_from_file": "/generate-roadmap/file"
+            "generate_from_file": "/generate-roadmap/file",
+            "generate_from_files": "/generate-roadmap/files",
+            "regenerate_from_text": "/generate-roadmap/incremental/{document_id}",
+            "regenerate_from_file": "/generate-roadmap/incremental/{document_id}/file"
         }
     }
 
@@ -45,93 +153,269 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
-@app.post("/generate-roadmap/text")
-async def generate_roadmap_from_text(request: RoadmapRequest):
+@app.get("/stats")
+async def stats():
+    library = orchestrator.enrichment_library
+    return {
+        "admission": admission.stats(),
+        "llm_hedging": orchestrator.llm_service.stats(),
+        "llm_cancellation": orchestrator.llm_service.cancellation_stats(),
+        "enrichment_cache": library.stats() if library is not None else None
+    }
+
+@app.post("/stats/enrichment-cache/evict")
+async def evict_enrichment_cache(max_age_days: float):
+    """Remove enrichment library entries older than max_age_days"""
+    library = orchestrator.enrichment_library
+    if library is None:
+        raise HTTPException(status_code=404, detail="Enrichment cache is disabled")
+    return {"evicted": library.evict_older_than(max_age_days * 86400)}
+
+@app.post("/generate-roadmap/text", response_model=RoadmapResponse)
+async def generate_roadmap_from_text(
+    request: RoadmapRequest,
+    http_request: Request,
+    profile_mode: bool = Query(False, alias="profile"),
+    _slot: None = Depends(admit)
+):
     """
     Generate roadmap from text input
     
+    Pass ?profile=1 to include the request's stage timeline in the response.
+    
     Body:
     {
-        "text": "Your learning content here..."
+        "text": "Your learning content here...",
+        "profile": "quality" | "latency",
+        "deadline_seconds": 60,
+        "max_tokens": 50000
     }
     """
-    try:
-        if not request.text:
-            raise HTTPException(status_code=400, detail="Text is required")
-        
-        # Generate roadmap
-        result = orchestrator.generate_roadmap(request.text)
+    with tracer.span("http.generate_roadmap", collect=profile_mode, source="text") as root:
+        try:
+            if not request.text:
+                raise HTTPException(status_code=400, detail="Text is required")
+            
+            # Generate roadmap
+            async with _cancel_on_disconnect(http_request) as cancel_event:
+                result = await run_in_threadpool(
+                    orchestrator.generate_roadmap,
+                    request.text,
+                    profile=request.profile,
+                    deadline_seconds=request.deadline_seconds,
+                    max_tokens=request.max_tokens,
+                    cancel_event=cancel_event
+                )
+            
+            response, body = _roadmap_response(result)
         
-        return RoadmapResponse(
-            success=True,
-            roadmap=result['roadmap'],
-            validation_score=result['validation_score'],
-            iterations=result['iterations']
-        )
+        except RequestCancelled:
+            return _cancelled_response()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            response, body = _roadmap_response(error=str(e))
     
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return RoadmapResponse(
-            success=False,
-            roadmap=None,
-            validation_score=0,
-            iterations=0,
-            error=str(e)
-        )
+    return _render(response, body, root if profile_mode else None)
 
-@app.post("/generate-roadmap/file")
-async def generate_roadmap_from_file(file: UploadFile = File(...)):
+@app.post("/generate-roadmap/file", response_model=RoadmapResponse)
+async def generate_roadmap_from_file(
+    http_request: Request,
+    file: UploadFile = File(...),
+    profile: GenerationProfile = Form(GenerationProfile.QUALITY),
+    deadline_seconds: Optional[float] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    profile_mode: bool = Query(False, alias="profile"),
+    _slot: None = Depends(admit)
+):
     """
     Generate roadmap from uploaded file (PDF, DOCX, TXT)
+    
+    Pass ?profile=1 to include the request's stage timeline in the response.
     """
-    try:
-        # Check file type
-        filename = file.filename.lower()
-        if filename.endswith('.pdf'):
-            file_type = 'pdf'
-        elif filename.endswith('.docx'):
-            file_type = 'docx'
-        elif filename.endswith('.txt'):
-            file_type = 'txt'
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file type. Please upload PDF, DOCX, or TXT file."
-            )
+    with tracer.span("http.generate_roadmap", collect=profile_mode, source="file") as root:
+        try:
+            # Check file type
+            file_type = _file_type(file.filename)
+            
+            # Read file content
+            file_content = await file.read()
+            
+            # Extract text
+            text = await run_in_threadpool(doc_processor.process_file, file_content, file_type)
+            
+            if not text or len(text.strip()) < 50:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Could not extract sufficient text from file"
+                )
+            
+            # Generate roadmap
+            async with _cancel_on_disconnect(http_request) as cancel_event:
+                result = await run_in_threadpool(
+                    orchestrator.generate_roadmap,
+                    text,
+                    profile=profile,
+                    deadline_seconds=deadline_seconds,
+                    max_tokens=max_tokens,
+                    cancel_event=cancel_event
+                )
+            
+            response, body = _roadmap_response(result)
         
-        # Read file content
-        file_content = await file.read()
-        
-        # Extract text
-        text = doc_processor.process_file(file_content, file_type)
+        except HTTPException:
+            raise
+        except RequestCancelled:
+            return _cancelled_response()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            response, body = _roadmap_response(error=str(e))
+    
+    return _render(response, body, root if profile_mode else None)
+
+@app.post("/generate-roadmap/files", response_model=RoadmapResponse)
+async def generate_roadmap_from_files(
+    http_request: Request,
+    files: List[UploadFile] = File(...),
+    profile: GenerationProfile = Form(GenerationProfile.QUALITY),
+    deadline_seconds: Optional[float] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    profile_mode: bool = Query(False, alias="profile"),
+    _slot: None = Depends(admit)
+):
+    """
+    Generate one roadmap from many uploaded files (PDF, DOCX, TXT)
+    
+    Files are extracted and analyzed concurrently, and their topics are
+    merged before prerequisite detection.
+    """
+    with tracer.span("http.generate_roadmap", collect=profile_mode, source="files", files=len(files)) as root:
+        try:
+            if len(files) > corpus_max_files:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Too many files. Upload at most {corpus_max_files} files."
+                )
+            
+            # Check every file type before doing any work
+            file_types = [_file_type(file.filename) for file in files]
+            
+            # Uploads are spooled to disk by Starlette, so each loader reads
+            # its file only when a worker picks the document up
+            documents = [
+                (file.filename, lambda file=file, file_type=file_type: doc_processor.process_file(file.file.read(), file_type))
+                for file, file_type in zip(files, file_types)
+            ]
+            
+            # Generate roadmap
+            async with _cancel_on_disconnect(http_request) as cancel_event:
+                result = await run_in_threadpool(
+                    orchestrator.generate_roadmap_from_corpus,
+                    documents,
+                    profile=profile,
+                    deadline_seconds=deadline_seconds,
+                    max_tokens=max_tokens,
+                    cancel_event=cancel_event
+                )
+            
+            response, body = _roadmap_response(result)
         
-        if not text or len(text.strip()) < 50:
-            raise HTTPException(
-                status_code=400,
-                detail="Could not extract sufficient text from file"
-            )
+        except HTTPException:
+            raise
+        except RequestCancelled:
+            return _cancelled_response()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            response, body = _roadmap_response(error=str(e))
+    
+    return _render(response, body, root if profile_mode else None)
+
+@app.post("/generate-roadmap/incremental/{document_id}", response_model=RoadmapResponse)
+async def regenerate_roadmap_from_text(
+    document_id: str,
+    request: RoadmapRequest,
+    http_request: Request,
+    profile_mode: bool = Query(False, alias="profile"),
+    _slot: None = Depends(admit)
+):
+    """
+    Create a new roadmap version for an edited document
+    
+    Only sections that changed since the stored version are re-analyzed.
+    The first call for a document_id generates and stores version 1.
+    """
+    with tracer.span("http.regenerate_roadmap", collect=profile_mode, source="text") as root:
+        try:
+            if not request.text:
+                raise HTTPException(status_code=400, detail="Text is required")
+            
+            async with _cancel_on_disconnect(http_request) as cancel_event:
+                result = await run_in_threadpool(
+                    orchestrator.regenerate_roadmap,
+                    document_id,
+                    request.text,
+                    profile=request.profile,
+                    deadline_seconds=request.deadline_seconds,
+                    max_tokens=request.max_tokens,
+                    cancel_event=cancel_event
+                )
+            
+            response, body = _roadmap_response(result)
         
-        # Generate roadmap
-        result = orchestrator.generate_roadmap(text)
+        except RequestCancelled:
+            return _cancelled_response()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            response, body = _roadmap_response(error=str(e))
+    
+    return _render(response, body, root if profile_mode else None)
+
+@app.post("/generate-roadmap/incremental/{document_id}/file", response_model=RoadmapResponse)
+async def regenerate_roadmap_from_file(
+    document_id: str,
+    http_request: Request,
+    file: UploadFile = File(...),
+    profile: GenerationProfile = Form(GenerationProfile.QUALITY),
+    deadline_seconds: Optional[float] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    profile_mode: bool = Query(False, alias="profile"),
+    _slot: None = Depends(admit)
+):
+    """
+    Create a new roadmap version from a re-uploaded file (PDF, DOCX, TXT)
+    """
+    with tracer.span("http.regenerate_roadmap", collect=profile_mode, source="file") as root:
+        try:
+            file_type = _file_type(file.filename)
+            text = await run_in_threadpool(doc_processor.process_file, await file.read(), file_type)
+            
+            if not text or len(text.strip()) < 50:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Could not extract sufficient text from file"
+                )
+            
+            async with _cancel_on_disconnect(http_request) as cancel_event:
+                result = await run_in_threadpool(
+                    orchestrator.regenerate_roadmap,
+                    document_id,
+                    text,
+                    profile=profile,
+                    deadline_seconds=deadline_seconds,
+                    max_tokens=max_tokens,
+                    cancel_event=cancel_event
+                )
+            
+            response, body = _roadmap_response(result)
         
-        return RoadmapResponse(
-            success=True,
-            roadmap=result['roadmap'],
-            validation_score=result['validation_score'],
-            iterations=result['iterations']
-        )
+        except HTTPException:
+            raise
+        except RequestCancelled:
+            return _cancelled_response()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            response, body = _roadmap_response(error=str(e))
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return RoadmapResponse(
-            success=False,
-            roadmap=None,
-            validation_score=0,
-            iterations=0,
-            error=str(e)
-        )
+    return _render(response, body, root if profile_mode else None)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
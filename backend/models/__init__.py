@@ -1,4 +1,6 @@
 from .schemas import (
+    GenerationProfile,
+    RequestPriority,
     TopicNode,
     RoadmapStructure,
     ValidationResult,
@@ -7,6 +9,8 @@ from .schemas import (
 )
 
 __all__ = [
+    'GenerationProfile',
+    'RequestPriority',
     'TopicNode',
     'RoadmapStructure',
     'ValidationResult',
@@ -0,0 +1,203 @@
+# backend/models/agent_outputs.py
+"""
+Schemas for agent replies
+
+These are deliberately lenient: they coerce the small type slips models
+make (a difficulty of "3/5" or "hard", a score of "78/100", a single string
+where a list is expected) and keep unknown fields, so the repaired JSON can
+be validated without rejecting usable output.
+"""
+import re
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Optional, Dict, Any
+
+# Agents rate difficulty from 1 (beginner) to 5 (expert)
+_DIFFICULTY_BY_LABEL = {
+    'beginner': 1,
+    'intermediate': 3,
+    'advanced': 4,
+    'expert': 5
+}
+
+_LABEL_SYNONYMS = {
+    'basic': 'beginner',
+    'easy': 'beginner',
+    'novice': 'beginner',
+    'medium': 'intermediate',
+    'moderate': 'intermediate',
+    'hard': 'advanced',
+    'difficult': 'advanced'
+}
+
+
+def _leading_number(value: Any) -> Any:
+    """Turn "3", "3/10" or 3.6 into an int, leaving anything else as is"""
+    if isinstance(value, float):
+        return round(value)
+    if isinstance(value, str):
+        match = re.match(r'\s*(\d+(?:\.\d+)?)', value)
+        if match:
+            return round(float(match.group(1)))
+    return value
+
+
+def _string_list(value: Any) -> Any:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [item if isinstance(item, str) else str(item) for item in value if item is not None]
+    return value
+
+
+def _resource_list(value: Any) -> Any:
+    if isinstance(value, list):
+        return [{'title': item} if isinstance(item, str) else item for item in value]
+    return value
+
+
+class _AgentOutput(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+
+class TopicOutput(_AgentOutput):
+    """A topic as returned by analysis, structure and refinement agents"""
+    topic: str
+    id: Optional[str] = None
+    description: Optional[str] = None
+    difficulty: Optional[int] = None
+    difficulty_label: Optional[str] = None
+    category: Optional[str] = None
+    time_estimate: Optional[str] = None
+    concepts: List[str] = Field(default_factory=list)
+    prerequisites: List[str] = Field(default_factory=list)
+    resources: List[Dict[str, Any]] = Field(default_factory=list)
+    project_ideas: List[str] = Field(default_factory=list)
+
+    @field_validator('difficulty', mode='before')
+    @classmethod
+    def _coerce_difficulty(cls, value):
+        if isinstance(value, str):
+            label = value.strip().lower()
+            label = _LABEL_SYNONYMS.get(label, label)
+            if label in _DIFFICULTY_BY_LABEL:
+                return _DIFFICULTY_BY_LABEL[label]
+        return _leading_number(value)
+
+    @field_validator('difficulty_label', mode='before')
+    @classmethod
+    def _coerce_label(cls, value):
+        if isinstance(value, str):
+            label = value.strip().lower()
+            return _LABEL_SYNONYMS.get(label, label)
+        return value
+
+    @field_validator('time_estimate', mode='before')
+    @classmethod
+    def _coerce_time(cls, value):
+        return str(value) if isinstance(value, (int, float)) else value
+
+    @field_validator('concepts', 'prerequisites', 'project_ideas', mode='before')
+    @classmethod
+    def _coerce_lists(cls, value):
+        return _string_list(value)
+
+    @field_validator('resources', mode='before')
+    @classmethod
+    def _coerce_resources(cls, value):
+        return _resource_list(value)
+
+
+class RefinedTopicOutput(TopicOutput):
+    """TopicRefiner reply; identity fields are restored by the orchestrator"""
+    topic: Optional[str] = None
+
+
+class TopicListOutput(_AgentOutput):
+    """ContentAnalyzer reply"""
+    topics: List[TopicOutput] = Field(default_factory=list)
+
+
+class RoadmapOutput(_AgentOutput):
+    """StructureArchitect and Refiner reply"""
+    title: Optional[str] = None
+    overview: Optional[str] = None
+    total_time_estimate: Optional[str] = None
+    topics: List[TopicOutput] = Field(default_factory=list)
+
+    @field_validator('total_time_estimate', mode='before')
+    @classmethod
+    def _coerce_time(cls, value):
+        return str(value) if isinstance(value, (int, float)) else value
+
+
+class PrerequisiteOutput(_AgentOutput):
+    """PrerequisiteDetector replies (flat, new-topic and module prompts)"""
+    prerequisites: Dict[str, List[str]] = Field(default_factory=dict)
+    learning_path: List[str] = Field(default_factory=list)
+    dependents: Dict[str, List[str]] = Field(default_factory=dict)
+    module_prerequisites: Dict[str, List[str]] = Field(default_factory=dict)
+    module_order: List[str] = Field(default_factory=list)
+
+    @field_validator('prerequisites', 'dependents', 'module_prerequisites', mode='before')
+    @classmethod
+    def _coerce_edges(cls, value):
+        if isinstance(value, dict):
+            return {str(name): _string_list(targets) for name, targets in value.items()}
+        return value
+
+    @field_validator('learning_path', 'module_order', mode='before')
+    @classmethod
+    def _coerce_lists(cls, value):
+        return _string_list(value)
+
+
+class EnrichedTopicOutput(_AgentOutput):
+    topic: str
+    resources: List[Dict[str, Any]] = Field(default_factory=list)
+    project_ideas: List[str] = Field(default_factory=list)
+
+    @field_validator('resources', mode='before')
+    @classmethod
+    def _coerce_resources(cls, value):
+        return _resource_list(value)
+
+    @field_validator('project_ideas', mode='before')
+    @classmethod
+    def _coerce_projects(cls, value):
+        return _string_list(value)
+
+
+class EnrichmentOutput(_AgentOutput):
+    """ContentEnricher reply"""
+    enriched_topics: List[EnrichedTopicOutput] = Field(default_factory=list)
+
+
+class ScoreOutput(_AgentOutput):
+    """Validator and CritiqueRefiner replies"""
+    score: int = Field(default=0, ge=0, le=100)
+    passed: bool = False
+    feedback: List[str] = Field(default_factory=list)
+    suggestions: List[str] = Field(default_factory=list)
+    topic_issues: Dict[str, List[str]] = Field(default_factory=dict)
+    topic_fixes: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    roadmap_fixes: Dict[str, Any] = Field(default_factory=dict)
+
+    @field_validator('score', mode='before')
+    @classmethod
+    def _coerce_score(cls, value):
+        value = _leading_number(value)
+        return min(100, max(0, value)) if isinstance(value, int) else value
+
+    @field_validator('feedback', 'suggestions', mode='before')
+    @classmethod
+    def _coerce_lists(cls, value):
+        return _string_list(value)
+
+    @field_validator('topic_issues', mode='before')
+    @classmethod
+    def _coerce_issues(cls, value):
+        if isinstance(value, dict):
+            return {str(topic_id): _string_list(issues) for topic_id, issues in value.items()}
+        return value
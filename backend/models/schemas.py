@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any
 from enum import Enum
 
 class DifficultyLevel(str, Enum):
@@ -9,6 +9,16 @@ class DifficultyLevel(str, Enum):
     ADVANCED="advanced"
     EXPERT="expert"
 
+class GenerationProfile(str, Enum):
+    """Trade-off between roadmap quality and request latency"""
+    QUALITY="quality"
+    LATENCY="latency"
+
+class RequestPriority(str, Enum):
+    """Admission lane of a generation request"""
+    INTERACTIVE="interactive"
+    BULK="bulk"
+
 class TopicNode(BaseModel):
     """Represents a single topic/concept in the roadmap"""
     id: str
@@ -37,12 +47,16 @@ class ValidationResult(BaseModel):
     passed: bool
     feedback: List[str] = Field(default_factory=list)
     suggestions: List[str] = Field(default_factory=list)
+    topic_issues: Dict[str, List[str]] = Field(default_factory=dict)
 
 class RoadmapRequest(BaseModel):
     """Input schema(text,file) for LLM for roadmap generation"""
     text: Optional[str] = None
     file_content: Optional[str] = None
     file_type: Optional[str] = None
+    profile: GenerationProfile = GenerationProfile.QUALITY
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    max_tokens: Optional[int] = Field(default=None, gt=0)
 
 class RoadmapResponse(BaseModel):
     """API response model"""
@@ -51,4 +65,6 @@ class RoadmapResponse(BaseModel):
     validation_score: int
     iterations: int
     error: Optional[str] = None
+    version: Optional[int] = None
+    profile: Optional[Dict[str, Any]] = None
 
@@ -0,0 +1,64 @@
+# backend/models/serialization.py
+from pydantic import TypeAdapter
+from typing import Dict, Any, Optional
+import json
+
+from .schemas import RoadmapStructure, RoadmapResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+# Adapters are built once at import time so every request reuses the
+# compiled pydantic-core validator/serializer instead of rebuilding them
+ROADMAP_ADAPTER = TypeAdapter(RoadmapStructure)
+RESPONSE_ADAPTER = TypeAdapter(RoadmapResponse)
+
+
+def dumps_compact(data: Any) -> str:
+    """Serialize plain python data to minified JSON (used for prompt embedding)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def validate_roadmap(roadmap: Dict[str, Any]) -> RoadmapStructure:
+    """Validate a roadmap dict exactly once"""
+    if isinstance(roadmap, RoadmapStructure):
+        return roadmap
+    return ROADMAP_ADAPTER.validate_python(roadmap)
+
+
+def build_response(
+    roadmap: Optional[Dict[str, Any]],
+    validation_score: int,
+    iterations: int,
+    error: Optional[str] = None,
+    version: Optional[int] = None
+) -> RoadmapResponse:
+    """
+    Build an API response, validating the roadmap once
+
+    The response itself is assembled with model_construct, so the already
+    validated TopicNodes are not walked a second time.
+    """
+    validated = validate_roadmap(roadmap) if roadmap is not None else None
+
+    return RoadmapResponse.model_construct(
+        success=error is None,
+        roadmap=validated,
+        validation_score=validation_score,
+        iterations=iterations,
+        error=error,
+        version=version
+    )
+
+
+def response_to_json(response: RoadmapResponse) -> bytes:
+    """Serialize a response with the precompiled pydantic-core serializer"""
+    return RESPONSE_ADAPTER.dump_json(response)
@@ -5,12 +5,29 @@ from agents import (
     StructureArchitect,
     ContentEnricher,
     Validator,
-    Refiner
+    Refiner,
+    TopicRefiner,
+    CritiqueRefiner
 )
-from services import LLMService
-from models.schemas import RoadmapStructure, TopicNode, ValidationResult
-from typing import Dict, Any
+from services import LLMService, RequestBudget, EnrichmentLibrary, RoadmapStore
+from services.tracing import tracer
+from models.schemas import RoadmapStructure, TopicNode, ValidationResult, GenerationProfile, DifficultyLevel
+from models.agent_outputs import TopicOutput
+from pydantic import TypeAdapter, ValidationError
+from services.prompt_encoding import restore_elided
+from utils.helpers import (
+    run_parallel,
+    merge_topics,
+    normalize_name,
+    match_topic,
+    split_sections,
+    section_hash,
+    topological_order
+)
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,69 +41,522 @@ class RoadmapOrchestrator:
         
         # Initialize all agents
         self.content_analyzer = ContentAnalyzer(self.llm_service)
-        self.prerequisite_detector = PrerequisiteDetector(self.llm_service)
+        self.prerequisite_detector = PrerequisiteDetector(
+            self.llm_service,
+            hierarchical_threshold=int(os.getenv("HIERARCHICAL_PREREQ_THRESHOLD", "60")),
+            module_size=int(os.getenv("PREREQ_MODULE_SIZE", "25")),
+            max_workers=int(os.getenv("PREREQ_WORKERS", "4"))
+        )
         self.structure_architect = StructureArchitect(self.llm_service)
-        self.content_enricher = ContentEnricher(self.llm_service)
+        self.enrichment_library = None
+        if os.getenv("ENRICHMENT_CACHE_ENABLED", "true").lower() == "true":
+            max_age_days = float(os.getenv("ENRICHMENT_CACHE_MAX_AGE_DAYS", "30"))
+            self.enrichment_library = EnrichmentLibrary(
+                path=os.getenv("ENRICHMENT_CACHE_PATH", "data/enrichment_library.json"),
+                max_age_seconds=max_age_days * 86400 if max_age_days > 0 else None
+            )
+        self.content_enricher = ContentEnricher(self.llm_service, library=self.enrichment_library)
         self.validator = Validator(self.llm_service)
         self.refiner = Refiner(self.llm_service)
+        self.topic_refiner = TopicRefiner(self.llm_service)
+        self.critique_refiner = CritiqueRefiner(self.llm_service)
+        
+        # Estimated input token budgets for encoded roadmaps/topic listings
+        # (0 = no limit); low-value fields are shortened to fit
+        prompt_budgets = {
+            self.validator: "PROMPT_TOKENS_VALIDATOR",
+            self.refiner: "PROMPT_TOKENS_REFINER",
+            self.critique_refiner: "PROMPT_TOKENS_CRITIQUE_REFINER",
+            self.structure_architect: "PROMPT_TOKENS_STRUCTURE_ARCHITECT",
+            self.content_enricher: "PROMPT_TOKENS_CONTENT_ENRICHER"
+        }
+        for agent, variable in prompt_budgets.items():
+            agent.prompt_token_budget = int(os.getenv(variable, "0")) or None
         
         # Configuration
         self.max_iterations = int(os.getenv("MAX_REFINEMENT_ITERATIONS", "3"))
         self.validation_threshold = int(os.getenv("VALIDATION_THRESHOLD", "85"))
+        self.min_score_improvement = float(os.getenv("MIN_SCORE_IMPROVEMENT", "2"))
+        self.default_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0")) or None
+        self.default_max_tokens = int(os.getenv("REQUEST_MAX_TOKENS", "0")) or None
+        self.partial_refinement_max_fraction = float(os.getenv("PARTIAL_REFINEMENT_MAX_FRACTION", "0.5"))
+        self.refinement_workers = int(os.getenv("REFINEMENT_WORKERS", "4"))
+        self.refinement_mode = os.getenv("REFINEMENT_MODE", "standard").lower()
+        self.corpus_workers = int(os.getenv("CORPUS_WORKERS", "4"))
+        self.roadmap_store = RoadmapStore(os.getenv("ROADMAP_STORE_DIR", "data/roadmaps"))
     
-    def generate_roadmap(self, text: str) -> Dict[str, Any]:
+    def generate_roadmap(
+        self,
+        text: str,
+        profile: GenerationProfile = GenerationProfile.QUALITY,
+        deadline_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
         """
         Generate roadmap from text using multi-agent system
         
         Args:
             text: Input text to analyze
+            profile: QUALITY runs the refinement loop, LATENCY skips it
+            deadline_seconds: Wall-clock budget for the whole request
+            max_tokens: Token budget for the whole request
+            cancel_event: Set when the client disconnects; remaining stages
+                are skipped and RequestCancelled is raised
         
         Returns:
             Dictionary with roadmap and metadata
         """
         print(" Starting roadmap generation...")
+        budget = RequestBudget(
+            deadline_seconds=deadline_seconds or self.default_deadline_seconds,
+            max_tokens=max_tokens or self.default_max_tokens,
+            cancel_event=cancel_event
+        )
+        
+        with tracer.span("orchestrator.generate_roadmap", profile=profile.value, text_chars=len(text)) as span:
+            # Step 1: Analyze content
+            print("\n Step 1: Analyzing content...")
+            budget.check()
+            with tracer.span("stage.analyze") as stage:
+                analysis_result = self.content_analyzer.run({'text': text}, budget=budget)
+                topics = analysis_result.get('topics', [])
+                stage.set_attribute("topics", len(topics))
+            print(f"   Found {len(topics)} topics")
+            
+            result = self._build_roadmap(topics, profile, budget)
+            span.set_attributes(
+                topics=len(result['roadmap'].get('topics', [])),
+                iterations=result['iterations'],
+                validation_score=result['validation_score'],
+                tokens=budget.tokens_used
+            )
+        
+        print(f"\n Roadmap generation complete!")
+        print(f"   Final score: {result['validation_score']}/100")
+        print(f"   Iterations: {result['iterations']} ({result['stop_reason']})")
+        print(f"   Tokens used: {budget.tokens_used}, elapsed: {budget.elapsed():.1f}s")
+        
+        result['tokens_used'] = budget.tokens_used
+        return result
+    
+    def generate_roadmap_from_corpus(
+        self,
+        documents: Iterable[Tuple[str, Callable[[], str]]],
+        profile: GenerationProfile = GenerationProfile.QUALITY,
+        deadline_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate one roadmap from many documents
+        
+        Args:
+            documents: (name, loader) pairs; loader extracts the document's
+                text and is only called by the worker analyzing it, so at most
+                CORPUS_WORKERS texts are held in memory at once
+            profile, deadline_seconds, max_tokens, cancel_event: As for generate_roadmap
+        
+        Returns:
+            Dictionary with roadmap and metadata
+        """
+        documents = list(documents)
+        print(f" Starting corpus roadmap generation for {len(documents)} documents...")
+        budget = RequestBudget(
+            deadline_seconds=deadline_seconds or self.default_deadline_seconds,
+            max_tokens=max_tokens or self.default_max_tokens,
+            cancel_event=cancel_event
+        )
+        
+        with tracer.span("orchestrator.generate_roadmap_from_corpus", profile=profile.value, documents=len(documents)) as span:
+            # Step 1: Extract and analyze every document independently
+            print("\n Step 1: Analyzing documents...")
+            
+            def analyze(document: Tuple[str, Callable[[], str]]) -> List[Dict[str, Any]]:
+                name, load = document
+                with tracer.span("document.analyze", document=name) as doc_span:
+                    text = load()
+                    if not text or len(text.strip()) < 50:
+                        print(f"   Skipping {name}: not enough text")
+                        return []
+                    doc_span.set_attribute("text_chars", len(text))
+                    topics = self.content_analyzer.run({'text': text}, budget=budget).get('topics', [])
+                    doc_span.set_attribute("topics", len(topics))
+                print(f"   {name}: {len(topics)} topics")
+                return topics
+            
+            with tracer.span("stage.analyze", documents=len(documents)) as stage:
+                topic_sets = []
+                for (name, _), result in zip(documents, run_parallel(analyze, documents, self.corpus_workers)):
+                    if isinstance(result, Exception):
+                        print(f"   Could not analyze {name}: {result}")
+                        continue
+                    topic_sets.append(result)
+                
+                topics = merge_topics(topic_sets)
+                stage.set_attributes(
+                    topics_before_merge=sum(len(t) for t in topic_sets),
+                    topics=len(topics)
+                )
+            print(f"   Merged {sum(len(t) for t in topic_sets)} topics into {len(topics)}")
+            
+            budget.check()
+            if not topics:
+                raise ValueError("Could not extract any topics from the uploaded documents")
+            
+            result = self._build_roadmap(topics, profile, budget)
+            span.set_attributes(
+                topics=len(result['roadmap'].get('topics', [])),
+                iterations=result['iterations'],
+                validation_score=result['validation_score'],
+                tokens=budget.tokens_used
+            )
+        
+        print(f"\n Corpus roadmap generation complete!")
+        print(f"   Final score: {result['validation_score']}/100")
+        print(f"   Tokens used: {budget.tokens_used}, elapsed: {budget.elapsed():.1f}s")
+        
+        result['tokens_used'] = budget.tokens_used
+        return result
+    
+    def regenerate_roadmap(
+        self,
+        document_id: str,
+        text: str,
+        profile: GenerationProfile = GenerationProfile.QUALITY,
+        deadline_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Produce a new roadmap version for an edited document
+        
+        The text is split into sections and compared with the stored version
+        by content hash. Only changed sections are re-analyzed; topics that
+        disappeared are dropped with their edges, re-extracted topics take
+        their new description, concepts and difficulty (and are re-enriched
+        if their concepts changed), and only new topics get prerequisite
+        detection and structure. The first upload of a document is analyzed
+        section by section and stored as version 1.
+        
+        Args:
+            document_id: Stable id of the source document
+            text: Newly extracted document text
+            profile, deadline_seconds, max_tokens, cancel_event: As for generate_roadmap
+        
+        Returns:
+            Dictionary with roadmap, metadata and the stored version number
+        """
+        budget = RequestBudget(
+            deadline_seconds=deadline_seconds or self.default_deadline_seconds,
+            max_tokens=max_tokens or self.default_max_tokens,
+            cancel_event=cancel_event
+        )
+        sections = split_sections(text)
+        hashes = [section_hash(section) for section in sections]
+        previous = self.roadmap_store.load(document_id)
+        
+        with tracer.span("orchestrator.regenerate_roadmap", document_id=document_id, sections=len(sections)) as span:
+            if previous is None:
+                print(f" No stored version of {document_id}, generating from scratch...")
+                print(f"\n Step 1: Analyzing {len(sections)} sections...")
+                section_topics = self._analyze_sections(sections, budget)
+                changed = list(range(len(sections)))
+                result = self._build_roadmap(merge_topics(section_topics), profile, budget)
+            else:
+                previous_sections = {section['hash']: section['topic_ids'] for section in previous['sections']}
+                changed = [i for i, h in enumerate(hashes) if h not in previous_sections]
+                removed = set(previous_sections) - set(hashes)
+                span.set_attributes(changed_sections=len(changed), removed_sections=len(removed))
+                print(f" Updating {document_id} v{previous['version']}: "
+                      f"{len(changed)} changed/added sections, {len(removed)} removed")
+                
+                if not changed and not removed:
+                    return {
+                        'roadmap': previous['roadmap'],
+                        'validation_score': previous['validation_score'],
+                        'iterations': 0,
+                        'stop_reason': 'unchanged',
+                        'version': previous['version']
+                    }
+                
+                changed_topics = self._analyze_sections([sections[i] for i in changed], budget)
+                section_topics = [previous_sections.get(h) for h in hashes]
+                for i, topics in zip(changed, changed_topics):
+                    section_topics[i] = topics
+                
+                result = self._update_roadmap(previous, section_topics, profile, budget)
+            
+            # Remember which topics each section produced for the next diff
+            section_ids = self._section_topic_ids(section_topics, changed, result['roadmap'].get('topics', []))
+            sections_record = [{'hash': h, 'topic_ids': ids} for h, ids in zip(hashes, section_ids)]
+            
+            result['version'] = self.roadmap_store.save(document_id, {
+                'sections': sections_record,
+                'roadmap': result['roadmap'],
+                'validation_score': result['validation_score']
+            })
+            span.set_attributes(version=result['version'], tokens=budget.tokens_used)
+        
+        print(f"\n Stored {document_id} v{result['version']}")
+        print(f"   Tokens used: {budget.tokens_used}, elapsed: {budget.elapsed():.1f}s")
+        
+        result['tokens_used'] = budget.tokens_used
+        return result
+    
+    @staticmethod
+    def _section_topic_ids(
+        section_topics: List[List[Any]],
+        analyzed: List[int],
+        final_topics: List[Dict[str, Any]]
+    ) -> List[List[str]]:
+        """
+        Attribute final topic ids to sections
+        
+        Stored ids carry over for unchanged sections; analyzed topics are
+        matched to final topics by name or concepts, which survives renames
+        by the structure and refinement stages. A final topic no section can
+        be traced to is attributed to every analyzed section, so it is only
+        dropped once all of them change.
+        """
+        final_ids = [t['id'] for t in final_topics if t.get('id')]
+        section_ids = []
+        for topics in section_topics:
+            ids = []
+            for topic in topics:
+                if isinstance(topic, str):
+                    topic_id = topic
+                else:
+                    match = match_topic(topic, final_topics)
+                    topic_id = match.get('id') if match else None
+                if topic_id in final_ids and topic_id not in ids:
+                    ids.append(topic_id)
+            section_ids.append(ids)
+        
+        attributed = {topic_id for ids in section_ids for topic_id in ids}
+        untraced = [topic_id for topic_id in final_ids if topic_id not in attributed]
+        for i in analyzed:
+            section_ids[i].extend(untraced)
+        return section_ids
+    
+    def _analyze_sections(self, sections: List[str], budget: RequestBudget) -> List[List[Dict[str, Any]]]:
+        """Run ContentAnalyzer on each section concurrently"""
+        def analyze(section: str) -> List[Dict[str, Any]]:
+            return self.content_analyzer.run({'text': section}, budget=budget).get('topics', [])
         
-        # Step 1: Analyze content
-        print("\n Step 1: Analyzing content...")
-        analysis_result = self.content_analyzer.run({'text': text})
-        topics = analysis_result.get('topics', [])
-        print(f"   Found {len(topics)} topics")
+        budget.check()
+        with tracer.span("stage.analyze", sections=len(sections)) as stage:
+            results = run_parallel(analyze, sections, self.corpus_workers)
+            for result in results:
+                # A failed section would otherwise look like deleted content
+                if isinstance(result, Exception):
+                    raise result
+            stage.set_attribute("topics", sum(len(topics) for topics in results))
+        return results
+    
+    def _update_roadmap(
+        self,
+        previous: Dict[str, Any],
+        section_topics: List[List[Any]],
+        profile: GenerationProfile,
+        budget: RequestBudget
+    ) -> Dict[str, Any]:
+        """
+        Apply section-level changes to the stored roadmap
+        
+        section_topics holds stored topic ids for unchanged sections and
+        freshly analyzed topic dicts for changed ones. The updated roadmap is
+        validated once under the quality profile; the latency profile skips
+        validation and reports a score of 0, as for a full generation.
+        """
+        roadmap = previous['roadmap']
+        kept_ids = set()
+        candidates = []
+        for topics in section_topics:
+            for topic in topics:
+                if isinstance(topic, str):
+                    kept_ids.add(topic)
+                else:
+                    candidates.append(topic)
+        
+        # Topics still present keep their nodes (and ids); everything else is dropped.
+        # Topics re-extracted from a changed section take its current content.
+        previous_topics = [dict(t) for t in roadmap.get('topics', [])]
+        kept = {t['topic'] for t in previous_topics if t.get('id') in kept_ids}
+        new_topics = []
+        updated = []
+        reenrich = []
+        for candidate in merge_topics([candidates]):
+            existing = match_topic(candidate, previous_topics)
+            if existing is None:
+                new_topics.append(candidate)
+                continue
+            kept.add(existing['topic'])
+            changed_fields = self._refresh_topic(existing, candidate)
+            if changed_fields:
+                updated.append(existing['topic'])
+            if 'concepts' in changed_fields:
+                reenrich.append(existing)
+        
+        retained = [t for t in previous_topics if t['topic'] in kept]
+        removed = {t['topic'] for t in previous_topics} - kept
+        print(f"   {len(retained)} topics kept ({len(updated)} updated), {len(new_topics)} added, {len(removed)} removed")
+        
+        dependencies = {
+            name: [p for p in prereqs if p not in removed]
+            for name, prereqs in roadmap.get('dependencies', {}).items()
+            if name not in removed
+        }
+        
+        new_nodes = []
+        if new_topics:
+            print("\n Detecting prerequisites for new topics...")
+            budget.check()
+            with tracer.span("stage.prerequisites", topics=len(new_topics)):
+                edges = self.prerequisite_detector.detect_for_new(new_topics, retained, budget=budget)
+            dependencies.update(edges['prerequisites'])
+            for new_name, dependents in edges['dependents'].items():
+                for dependent in dependents:
+                    if new_name not in dependencies.setdefault(dependent, []):
+                        dependencies[dependent].append(new_name)
+            
+            print("\n Structuring new topics...")
+            budget.check()
+            with tracer.span("stage.structure", topics=len(new_topics)):
+                structure_result = self.structure_architect.run({
+                    'topics': new_topics,
+                    'prerequisites': edges['prerequisites'],
+                    'learning_path': [t['topic'] for t in new_topics]
+                }, budget=budget)
+            new_nodes = structure_result.get('topics', [])
+            
+            # Continue the previous version's id sequence so retained ids stay
+            # stable and removed topics' ids are never handed to new topics
+            used_ids = [
+                int(t['id'].split('_')[-1])
+                for t in previous_topics
+                if str(t.get('id', '')).split('_')[-1].isdigit()
+            ]
+            next_id = max(used_ids, default=0) + 1
+            for offset, node in enumerate(new_nodes):
+                node['id'] = f"topic_{next_id + offset}"
         
+        # New topics and topics whose concepts changed need fresh resources
+        to_enrich = new_nodes + reenrich
+        if to_enrich:
+            print(f"\n Enriching {len(to_enrich)} topics...")
+            budget.check()
+            with tracer.span("stage.enrich", topics=len(to_enrich)):
+                enrichment_result = self.content_enricher.run({'topics': to_enrich}, budget=budget)
+            self._apply_enrichment(to_enrich, enrichment_result, dependencies)
+        
+        topics = retained + new_nodes
+        names = [t['topic'] for t in topics]
+        dependencies = {name: dependencies.get(name, []) for name in names}
+        for topic in topics:
+            topic['prerequisites'] = dependencies[topic['topic']]
+        
+        known = set(names)
+        path = [name for name in roadmap.get('learning_path', []) if name in known]
+        learning_path = topological_order(list(dict.fromkeys(path + names)), dependencies)
+        updated_roadmap = {
+            **roadmap,
+            'topics': topics,
+            'dependencies': dependencies,
+            'learning_path': learning_path
+        }
+        
+        # The previous score describes a different roadmap, so it is never carried over
+        validation_score = 0
+        iterations = 0
+        if profile == GenerationProfile.LATENCY:
+            print("\n Validation skipped (latency profile)")
+        else:
+            print("\n Validating updated roadmap...")
+            budget.check()
+            with tracer.span("refinement.validate", iteration=1, topics=len(topics)) as span:
+                validation_result = self.validator.run({'roadmap': updated_roadmap}, budget=budget)
+                validation_score = validation_result.get('score', 0)
+                span.set_attributes(score=validation_score, passed=validation_result.get('passed', False))
+            print(f"   Score: {validation_score}/100")
+            iterations = 1
+        
+        return {
+            'roadmap': updated_roadmap,
+            'validation_score': validation_score,
+            'iterations': iterations,
+            'stop_reason': 'incremental',
+            'changes': {
+                'added': [t['topic'] for t in new_nodes],
+                'updated': updated,
+                'removed': sorted(removed)
+            }
+        }
+    
+    @staticmethod
+    def _refresh_topic(topic: Dict[str, Any], extracted: Dict[str, Any]) -> set:
+        """
+        Update a stored topic in place from its re-extracted version
+        
+        Only content the analyzer produces is taken over; id, name, edges
+        and enrichment stay. Returns the names of the fields that changed.
+        """
+        changed = set()
+        if extracted.get('description') and extracted['description'] != topic.get('description'):
+            topic['description'] = extracted['description']
+            changed.add('description')
+        concepts = extracted.get('concepts') or []
+        if concepts and {normalize_name(c) for c in concepts} != {normalize_name(c) for c in topic.get('concepts', [])}:
+            topic['concepts'] = list(concepts)
+            changed.add('concepts')
+        if extracted.get('difficulty') is not None and extracted['difficulty'] != topic.get('difficulty'):
+            topic['difficulty'] = extracted['difficulty']
+            changed.add('difficulty')
+        label = extracted.get('difficulty_label')
+        if label in {level.value for level in DifficultyLevel} and label != topic.get('difficulty_label'):
+            topic['difficulty_label'] = label
+            changed.add('difficulty_label')
+        return changed
+    
+    def _build_roadmap(
+        self,
+        topics: List[Dict[str, Any]],
+        profile: GenerationProfile,
+        budget: RequestBudget
+    ) -> Dict[str, Any]:
+        """Run steps 2-5 (prerequisites, structure, enrichment, refinement) on analyzed topics"""
         # Step 2: Detect prerequisites
         print("\n Step 2: Detecting prerequisites...")
-        prereq_result = self.prerequisite_detector.run({'topics': topics})
-        prerequisites = prereq_result.get('prerequisites', {})
-        learning_path = prereq_result.get('learning_path', [])
+        budget.check()
+        with tracer.span("stage.prerequisites", topics=len(topics)) as stage:
+            prereq_result = self.prerequisite_detector.run({'topics': topics}, budget=budget)
+            prerequisites = prereq_result.get('prerequisites', {})
+            learning_path = prereq_result.get('learning_path', [])
+            stage.set_attribute("edges", sum(len(p) for p in prerequisites.values()))
         print(f"   Created learning path with {len(learning_path)} steps")
         
         # Step 3: Create structure
         print("\n🏗️ Step 3: Building structure...")
-        structure_result = self.structure_architect.run({
-            'topics': topics,
-            'prerequisites': prerequisites,
-            'learning_path': learning_path
-        })
+        budget.check()
+        with tracer.span("stage.structure", topics=len(topics)):
+            structure_result = self.structure_architect.run({
+                'topics': topics,
+                'prerequisites': prerequisites,
+                'learning_path': learning_path
+            }, budget=budget)
         print(f"   Title: {structure_result.get('title', 'N/A')}")
         print(f"   Total time: {structure_result.get('total_time_estimate', 'N/A')}")
         
         # Step 4: Enrich content
         print("\n Step 4: Enriching content...")
-        enrichment_result = self.content_enricher.run({
-            'topics': structure_result.get('topics', [])
-        })
+        budget.check()
+        with tracer.span("stage.enrich", topics=len(structure_result.get('topics', []))):
+            enrichment_result = self.content_enricher.run({
+                'topics': structure_result.get('topics', [])
+            }, budget=budget)
         
         # Merge enrichment into structure
-        enriched_topics_map = {
-            et['topic']: et for et in enrichment_result.get('enriched_topics', [])
-        }
-        
-        for topic in structure_result.get('topics', []):
-            topic_name = topic['topic']
-            if topic_name in enriched_topics_map:
-                enrichment = enriched_topics_map[topic_name]
-                topic['resources'] = enrichment.get('resources', [])
-                topic['project_ideas'] = enrichment.get('project_ideas', [])
-                topic['prerequisites'] = prerequisites.get(topic_name, [])
+        self._apply_enrichment(structure_result.get('topics', []), enrichment_result, prerequisites)
         
         # Create initial roadmap
         roadmap = {
@@ -99,46 +569,353 @@ class RoadmapOrchestrator:
         }
         
         # Step 5: Validation and refinement loop
+        if profile == GenerationProfile.LATENCY:
+            print("\n Step 5: Skipped (latency profile)")
+            return {
+                'roadmap': roadmap,
+                'validation_score': 0,
+                'iterations': 0,
+                'stop_reason': 'latency_profile'
+            }
+        
+        budget.check()
         print("\n Step 5: Validation and refinement...")
+        with tracer.span("stage.refinement", mode=self.refinement_mode) as stage:
+            if self.refinement_mode == "fused":
+                result = self._fused_refine_loop(roadmap, budget)
+            else:
+                result = self._refine_loop(roadmap, budget)
+            stage.set_attributes(iterations=result['iterations'], stop_reason=result['stop_reason'])
+        return result
+    
+    def _apply_enrichment(
+        self,
+        topics: List[Dict[str, Any]],
+        enrichment_result: Dict[str, Any],
+        prerequisites: Dict[str, List[str]]
+    ):
+        """Merge enricher output into structured topics in place"""
+        enriched_topics_map = {
+            et['topic']: et for et in enrichment_result.get('enriched_topics', [])
+        }
+        
+        for topic in topics:
+            topic_name = topic['topic']
+            if topic_name in enriched_topics_map:
+                enrichment = enriched_topics_map[topic_name]
+                topic['resources'] = enrichment.get('resources', [])
+                topic['project_ideas'] = enrichment.get('project_ideas', [])
+                topic['prerequisites'] = prerequisites.get(topic_name, [])
+    
+    def _refine_loop(self, roadmap: Dict[str, Any], budget: RequestBudget) -> Dict[str, Any]:
+        """
+        Validate and refine until passed, plateau, budget exhaustion or max iterations
+        
+        Returns the best-scoring roadmap seen, not necessarily the last one.
+        """
         iteration = 0
-        validation_score = 0
+        best_roadmap = roadmap
+        best_score = None
+        previous_score = None
+        round_seconds = None
+        round_tokens = None
+        stop_reason = 'max_iterations'
         
         while iteration < self.max_iterations:
+            budget.check()
+            if not budget.can_afford():
+                print("     Budget exhausted")
+                stop_reason = 'budget'
+                break
+            
             iteration += 1
             print(f"\n   Iteration {iteration}/{self.max_iterations}")
+            round_start = time.monotonic()
+            tokens_before = budget.tokens_used
             
             # Validate
             print("     Validating...")
-            validation_result = self.validator.run({'roadmap': roadmap})
-            validation_score = validation_result.get('score', 0)
-            passed = validation_result.get('passed', False)
+            with tracer.span("refinement.validate", iteration=iteration, topics=len(roadmap.get('topics', []))) as span:
+                validation_result = self.validator.run({'roadmap': roadmap}, budget=budget)
+                validation_score = validation_result.get('score', 0)
+                passed = validation_result.get('passed', False)
+                span.set_attributes(score=validation_score, passed=passed)
             
             print(f"   Score: {validation_score}/100")
             
+            if best_score is None or validation_score > best_score:
+                best_roadmap = roadmap
+                best_score = validation_score
+            
             if passed:
                 print("   Validation passed!")
+                stop_reason = 'passed'
+                break
+            
+            if previous_score is not None and validation_score - previous_score < self.min_score_improvement:
+                print("     Score plateaued")
+                stop_reason = 'plateau'
                 break
+            previous_score = validation_score
             
             if iteration >= self.max_iterations:
                 print("     Max iterations reached")
                 break
             
-            # Refine
-            print("    Refining roadmap...")
-            refined = self.refiner.run({
-                'roadmap': roadmap,
-                'validation': validation_result
-            })
+            # A refinement is only useful if the re-validation fits too, so
+            # estimate a full round from the previous one (or twice this validation)
+            if round_seconds is None:
+                round_seconds = 2 * (time.monotonic() - round_start)
+                round_tokens = 2 * (budget.tokens_used - tokens_before)
+            if not budget.can_afford(seconds=round_seconds, tokens=round_tokens):
+                print("     Not enough budget for another round")
+                stop_reason = 'budget'
+                break
+            
+            # Refine (earlier versions stay intact for best-so-far tracking)
+            flagged = self._flagged_topics(roadmap, validation_result)
+            with tracer.span("refinement.refine", iteration=iteration, flagged_topics=len(flagged)):
+                if flagged:
+                    print(f"    Refining {len(flagged)} flagged topics...")
+                    roadmap = self._refine_topics(roadmap, flagged, budget)
+                else:
+                    print("    Refining roadmap...")
+                    refined = self.refiner.run({
+                        'roadmap': roadmap,
+                        'validation': validation_result
+                    }, budget=budget)
+                    # The Refiner may have seen shortened fields; keep the originals
+                    if 'topics' in refined:
+                        refined['topics'] = restore_elided(roadmap.get('topics', []), refined['topics'])
+                    roadmap = {**roadmap, **refined}
             
-            # Update roadmap
-            roadmap.update(refined)
+            round_seconds = time.monotonic() - round_start
+            round_tokens = budget.tokens_used - tokens_before
         
-        print(f"\n Roadmap generation complete!")
-        print(f"   Final score: {validation_score}/100")
-        print(f"   Iterations: {iteration}")
+        return {
+            'roadmap': best_roadmap,
+            'validation_score': best_score or 0,
+            'iterations': iteration,
+            'stop_reason': stop_reason
+        }
+    
+    def _fused_refine_loop(self, roadmap: Dict[str, Any], budget: RequestBudget) -> Dict[str, Any]:
+        """
+        Refinement loop with one critique-and-fix call per iteration
+        
+        CritiqueRefiner scores the roadmap and proposes field-level fixes in
+        one completion; the fixes are applied locally and confirmed with a
+        cheap re-score that only sees the edited parts. Stops on pass,
+        plateau, budget exhaustion or max iterations, returning the best
+        roadmap seen.
+        
+        A re-score is only an estimate: once the next critique fully scores
+        the same roadmap, that score replaces it. The estimate is reported
+        only for a final candidate the loop never fully scored.
+        """
+        iteration = 0
+        best_roadmap = roadmap
+        best_score = None
+        previous_score = None
+        estimate = None
+        stop_reason = 'max_iterations'
+        
+        while iteration < self.max_iterations:
+            budget.check()
+            if not budget.can_afford():
+                print("     Budget exhausted")
+                stop_reason = 'budget'
+                break
+            
+            iteration += 1
+            print(f"\n   Iteration {iteration}/{self.max_iterations}")
+            
+            print("     Critiquing and fixing...")
+            with tracer.span("refinement.critique", iteration=iteration, topics=len(roadmap.get('topics', []))) as span:
+                critique = self.critique_refiner.run({'roadmap': roadmap}, budget=budget)
+                score = critique.get('score', 0)
+                span.set_attributes(score=score, passed=critique.get('passed', False))
+            print(f"   Score: {score}/100")
+            
+            estimate = None
+            if best_score is None or score > best_score:
+                best_roadmap, best_score = roadmap, score
+            
+            if critique.get('passed', False):
+                print("   Validation passed!")
+                stop_reason = 'passed'
+                break
+            
+            if previous_score is not None and score - previous_score < self.min_score_improvement:
+                print("     Score plateaued")
+                stop_reason = 'plateau'
+                break
+            
+            candidate, changed_topics, roadmap_fixes = self._apply_fixes(roadmap, critique)
+            if not changed_topics and not roadmap_fixes:
+                print("     No fixes proposed")
+                stop_reason = 'no_fixes'
+                break
+            
+            with tracer.span("refinement.rescore", iteration=iteration, changed_topics=len(changed_topics)) as span:
+                confirmation = self.critique_refiner.rescore(
+                    score,
+                    critique.get('feedback', []),
+                    changed_topics,
+                    roadmap_fixes,
+                    budget=budget
+                )
+                new_score = confirmation.get('score', 0)
+                span.set_attribute("score", new_score)
+            print(f"   Re-score after {len(changed_topics)} topic fixes: {new_score}/100")
+            estimate = (candidate, new_score)
+            
+            if confirmation.get('passed', False):
+                print("   Validation passed!")
+                stop_reason = 'passed'
+                break
+            
+            roadmap = candidate
+            previous_score = score
+        
+        if estimate is not None and (best_score is None or estimate[1] > best_score):
+            best_roadmap, best_score = estimate
         
         return {
-            'roadmap': roadmap,
-            'validation_score': validation_score,
-            'iterations': iteration
-        }
\ No newline at end of file
+            'roadmap': best_roadmap,
+            'validation_score': best_score or 0,
+            'iterations': iteration,
+            'stop_reason': stop_reason
+        }
+    
+    def _apply_fixes(self, roadmap: Dict[str, Any], critique: Dict[str, Any]):
+        """
+        Apply CritiqueRefiner fixes to a copy of the roadmap
+        
+        Returns:
+            (new roadmap, edited topics, applied roadmap-level fixes)
+        """
+        editable_fields = {
+            'description', 'difficulty_label', 'category', 'time_estimate',
+            'concepts', 'prerequisites', 'resources', 'project_ideas'
+        }
+        topic_fixes = critique.get('topic_fixes') or {}
+        dependencies = dict(roadmap.get('dependencies', {}))
+        
+        topics = []
+        changed_topics = []
+        for topic in roadmap.get('topics', []):
+            fixes = self._coerce_fixes(
+                topic['topic'],
+                {k: v for k, v in (topic_fixes.get(topic.get('id')) or {}).items() if k in editable_fields}
+            )
+            if fixes:
+                # All topics go in so prerequisites given as ids map back to names
+                topic = restore_elided(roadmap.get('topics', []), [{**topic, **fixes}])[0]
+                changed_topics.append(topic)
+                if 'prerequisites' in fixes:
+                    dependencies[topic['topic']] = topic['prerequisites']
+            topics.append(topic)
+        
+        roadmap_fixes = {
+            k: v for k, v in (critique.get('roadmap_fixes') or {}).items()
+            if k in ('overview', 'total_time_estimate', 'learning_path')
+        }
+        # The encoded roadmap shows the path as ids; a reordered path must
+        # still contain exactly the roadmap's topics
+        if 'learning_path' in roadmap_fixes:
+            names_by_id = {topic['id']: topic['topic'] for topic in topics if topic.get('id')}
+            path = roadmap_fixes['learning_path']
+            path = [names_by_id.get(step, step) for step in path] if isinstance(path, list) else []
+            names = [topic['topic'] for topic in topics]
+            if sorted(path) == sorted(names):
+                roadmap_fixes['learning_path'] = path
+            else:
+                del roadmap_fixes['learning_path']
+        
+        candidate = {**roadmap, **roadmap_fixes, 'topics': topics, 'dependencies': dependencies}
+        return candidate, changed_topics, roadmap_fixes
+    
+    @staticmethod
+    def _coerce_fixes(topic_name: str, fixes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Coerce proposed field values, dropping any that would break the roadmap
+        
+        Values get the same lenient coercion as agent replies and must then
+        fit the TopicNode field type (e.g. a known difficulty label).
+        """
+        coerced = {}
+        for field, value in fixes.items():
+            try:
+                value = getattr(TopicOutput.model_validate({'topic': topic_name, field: value}), field)
+                TypeAdapter(TopicNode.model_fields[field].annotation).validate_python(value)
+            except ValidationError:
+                print(f"     Dropping invalid {field} fix for {topic_name}")
+                continue
+            coerced[field] = value
+        return coerced
+    
+    def _flagged_topics(self, roadmap: Dict[str, Any], validation_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return {topic_id: issues} when partial refinement applies, else {}
+        
+        Partial refinement applies when the validator reported no roadmap-wide
+        feedback and only a limited fraction of topics was flagged.
+        """
+        if validation_result.get('feedback'):
+            return {}
+        
+        topic_ids = {topic.get('id') for topic in roadmap.get('topics', [])}
+        flagged = {
+            topic_id: issues
+            for topic_id, issues in (validation_result.get('topic_issues') or {}).items()
+            if topic_id in topic_ids and issues
+        }
+        
+        if not flagged or len(flagged) > self.partial_refinement_max_fraction * len(topic_ids):
+            return {}
+        return flagged
+    
+    def _refine_topics(
+        self,
+        roadmap: Dict[str, Any],
+        flagged: Dict[str, Any],
+        budget: RequestBudget
+    ) -> Dict[str, Any]:
+        """Regenerate only the flagged topics concurrently and splice them back"""
+        dependencies = roadmap.get('dependencies', {})
+        targets = [topic for topic in roadmap.get('topics', []) if topic.get('id') in flagged]
+        
+        def refine(topic: Dict[str, Any]) -> Dict[str, Any]:
+            return self.topic_refiner.run({
+                'topic': topic,
+                'issues': flagged[topic['id']],
+                'roadmap_title': roadmap.get('title', ''),
+                'prerequisites': topic.get('prerequisites') or dependencies.get(topic['topic'], [])
+            }, budget=budget)
+        
+        names = {topic['topic'] for topic in roadmap.get('topics', [])}
+        names_by_id = {topic['id']: topic['topic'] for topic in roadmap.get('topics', []) if topic.get('id')}
+        editable_fields = set(TopicNode.model_fields) - {'id', 'topic'}
+        
+        refined_by_id = {}
+        new_dependencies = dict(dependencies)
+        for topic, result in zip(targets, run_parallel(refine, targets, self.refinement_workers)):
+            if isinstance(result, Exception):
+                print(f"     Could not refine {topic['id']}: {result}")
+                continue
+            
+            # Identity is fixed; the model may only change the topic's content,
+            # and only with values the final RoadmapStructure accepts
+            fixes = self._coerce_fixes(topic['topic'], {k: v for k, v in result.items() if k in editable_fields})
+            if 'prerequisites' in fixes:
+                prerequisites = [names_by_id.get(p, p) for p in fixes['prerequisites']]
+                fixes['prerequisites'] = [p for p in dict.fromkeys(prerequisites) if p in names and p != topic['topic']]
+                new_dependencies[topic['topic']] = fixes['prerequisites']
+            refined_by_id[topic['id']] = {**topic, **fixes}
+        
+        return {
+            **roadmap,
+            'topics': [refined_by_id.get(topic.get('id'), topic) for topic in roadmap.get('topics', [])],
+            'dependencies': new_dependencies
+        }
@@ -1,4 +1,19 @@
 from .llm_service import LLMService
 from .document_processor import DocumentProcessor
+from .budget import RequestBudget, RequestCancelled
+from .enrichment_library import EnrichmentLibrary
+from .roadmap_store import RoadmapStore
+from .admission import AdmissionController, AdmissionRejected
+from .rate_limit import SharedRateLimiter
 
-__all__ = ['LLMService','DocumentProcessor']
\ No newline at end of file
+__all__ = [
+    'LLMService',
+    'DocumentProcessor',
+    'RequestBudget',
+    'RequestCancelled',
+    'EnrichmentLibrary',
+    'RoadmapStore',
+    'AdmissionController',
+    'AdmissionRejected',
+    'SharedRateLimiter'
+]
\ No newline at end of file
@@ -0,0 +1,177 @@
+# backend/services/admission.py
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+from models.schemas import RequestPriority
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded, prioritized wait queue
+
+    At most max_concurrent pipelines run at once. Further requests wait in
+    a per-priority FIFO lane (interactive lanes are always served first).
+    A request is shed with 503 when the queue is full and with 429 when its
+    predicted wait exceeds the lane's max wait, so accepted requests keep a
+    predictable latency under overload. An interactive request arriving at a
+    full queue displaces the newest bulk waiter (which gets the 503) rather
+    than being shed itself, so bulk traffic cannot lock interactive users out.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 32,
+        max_wait_seconds: Optional[Dict[RequestPriority, float]] = None,
+        initial_service_seconds: float = 30.0
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds or {
+            RequestPriority.INTERACTIVE: 10.0,
+            RequestPriority.BULK: 120.0
+        }
+        # Lanes in service order
+        self.queues: Dict[RequestPriority, deque] = {
+            RequestPriority.INTERACTIVE: deque(),
+            RequestPriority.BULK: deque()
+        }
+        self.in_flight = 0
+        self.avg_service_seconds = initial_service_seconds
+        self.admitted = 0
+        self.completed = 0
+        self.shed_queue_full = 0
+        self.shed_displaced = 0
+        self.shed_wait = 0
+        self.shed_timeout = 0
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def predicted_wait(self, priority: RequestPriority) -> float:
+        """Estimate how long a new request of this priority would wait"""
+        ahead = 0
+        for lane, queue in self.queues.items():
+            ahead += len(queue)
+            if lane == priority:
+                break
+
+        if self.in_flight < self.max_concurrent and ahead == 0:
+            return 0.0
+        return (ahead + 1) / self.max_concurrent * self.avg_service_seconds
+
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        """Hold one pipeline slot for the duration of the block"""
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    async def _acquire(self, priority: RequestPriority):
+        if self.in_flight < self.max_concurrent and self.queue_depth() == 0:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        max_wait = self.max_wait_seconds[priority]
+        predicted = self.predicted_wait(priority)
+
+        if predicted > max_wait:
+            self.shed_wait += 1
+            raise AdmissionRejected(429, predicted, "Predicted queue wait exceeds the deadline")
+
+        # Only displace bulk work for a request that will actually be queued
+        if self.queue_depth() >= self.max_queue:
+            if not self._displace_bulk(priority):
+                self.shed_queue_full += 1
+                raise AdmissionRejected(503, predicted, "Server is at capacity, queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[priority].append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max_wait)
+        except asyncio.TimeoutError:
+            self._abandon(priority, waiter)
+            self.shed_timeout += 1
+            raise AdmissionRejected(503, self.predicted_wait(priority), "Timed out waiting in queue")
+        except asyncio.CancelledError:
+            self._abandon(priority, waiter)
+            raise
+
+        self.admitted += 1
+
+    def _displace_bulk(self, priority: RequestPriority) -> bool:
+        """Shed the newest bulk waiter to make room for an interactive request"""
+        if priority == RequestPriority.BULK:
+            return False
+        bulk = self.queues[RequestPriority.BULK]
+        while bulk:
+            waiter = bulk.pop()
+            if not waiter.done():
+                waiter.set_exception(AdmissionRejected(
+                    503,
+                    self.predicted_wait(RequestPriority.BULK),
+                    "Server is at capacity, displaced by interactive traffic"
+                ))
+                self.shed_displaced += 1
+                return True
+        return False
+
+    def _abandon(self, priority: RequestPriority, waiter: asyncio.Future):
+        """Leave the queue; if a slot was already handed over, pass it on"""
+        if waiter.done():
+            self._release(None)
+            return
+        waiter.cancel()
+        try:
+            self.queues[priority].remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self, service_seconds: Optional[float]):
+        if service_seconds is not None:
+            self.completed += 1
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * service_seconds
+
+        # Hand the slot straight to the next waiter so in_flight stays put
+        for queue in self.queues.values():
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.in_flight,
+            'max_concurrent': self.max_concurrent,
+            'queue_depth': self.queue_depth(),
+            'queue_depth_by_priority': {lane.value: len(queue) for lane, queue in self.queues.items()},
+            'avg_service_seconds': round(self.avg_service_seconds, 3),
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'shed': {
+                'queue_full': self.shed_queue_full,
+                'displaced': self.shed_displaced,
+                'predicted_wait': self.shed_wait,
+                'timeout': self.shed_timeout
+            }
+        }
@@ -0,0 +1,74 @@
+# backend/services/budget.py
+import threading
+import time
+from typing import Optional
+
+
+class RequestCancelled(Exception):
+    """Raised when the client that asked for a request has gone away"""
+    pass
+
+
+class RequestBudget:
+    """
+    Per-request wall-clock deadline and token budget
+
+    A request may also carry a cancel event, set from the HTTP layer when the
+    client disconnects; work checks it cooperatively and stops early.
+    """
+
+    def __init__(
+        self,
+        deadline_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None
+    ):
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + deadline_seconds if deadline_seconds else None
+        self.max_tokens = max_tokens
+        self.tokens_used = 0
+        self.cancel_event = cancel_event
+        self._lock = threading.Lock()
+
+    @property
+    def cancellable(self) -> bool:
+        return self.cancel_event is not None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def check(self):
+        """Raise RequestCancelled if the client has disconnected"""
+        if self.cancelled:
+            raise RequestCancelled("Client disconnected")
+
+    def charge(self, tokens: int):
+        """Record tokens spent by an LLM call"""
+        with self._lock:
+            self.tokens_used += tokens
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def remaining_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.tokens_used)
+
+    def can_afford(self, seconds: float = 0.0, tokens: int = 0) -> bool:
+        """Check whether another step of the given estimated cost fits"""
+        remaining_seconds = self.remaining_seconds()
+        if remaining_seconds is not None and remaining_seconds <= seconds:
+            return False
+
+        remaining_tokens = self.remaining_tokens()
+        if remaining_tokens is not None and remaining_tokens <= tokens:
+            return False
+
+        return True
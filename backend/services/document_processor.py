@@ -3,6 +3,7 @@ import PyPDF2
 from docx import Document
 import io
 from typing import Optional
+from .tracing import tracer
 
 class DocumentProcessor:
     """Process different document formats"""
@@ -49,6 +50,13 @@ class DocumentProcessor:
     @staticmethod
     def process_file(file_content: bytes, file_type: str) -> str:
         """Process file based on type and returns file content"""
+        with tracer.span("document.extract", file_type=file_type, input_bytes=len(file_content)) as span:
+            text = DocumentProcessor._process_file(file_content, file_type)
+            span.set_attribute("output_chars", len(text))
+            return text
+    
+    @staticmethod
+    def _process_file(file_content: bytes, file_type: str) -> str:
         try: 
             extension = file_type.lower().lstrip('.')
 
@@ -0,0 +1,189 @@
+# backend/services/enrichment_library.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.helpers import normalize_name, jaccard
+
+
+class EnrichmentLibrary:
+    """
+    Persistent cross-request cache of topic enrichments
+
+    Entries are keyed on the normalized topic name plus its concept set.
+    An inverted index from concept to entry keys lets a topic whose concept
+    set differs slightly from a stored one still reuse that entry.
+
+    Saves are only safe within one process; processes sharing a path should
+    all but one run with persist=False.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_age_seconds: Optional[float] = None,
+        similarity_threshold: float = 0.6,
+        persist: bool = True
+    ):
+        self.path = path
+        self.persist = persist
+        self.max_age_seconds = max_age_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.concept_index: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(topic_name: str, concepts: List[str]) -> str:
+        """Key on normalized name plus a digest of the normalized concept set"""
+        concept_set = sorted({normalize_name(c) for c in concepts})
+        digest = hashlib.sha1("|".join(concept_set).encode('utf-8')).hexdigest()[:12]
+        return f"{normalize_name(topic_name)}#{digest}"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+        except (OSError, ValueError) as e:
+            print(f"Could not load enrichment library: {e}")
+            self.entries = {}
+        self.evict_older_than(self.max_age_seconds, save=False)
+        for key, entry in self.entries.items():
+            self._index(key, entry)
+
+    def _index(self, key: str, entry: Dict[str, Any]):
+        for concept in entry.get('concepts', []):
+            self.concept_index.setdefault(concept, set()).add(key)
+
+    def _unindex(self, key: str, entry: Dict[str, Any]):
+        for concept in entry.get('concepts', []):
+            keys = self.concept_index.get(concept)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.concept_index[concept]
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        if self.max_age_seconds is None:
+            return True
+        return time.time() - entry.get('created_at', 0) <= self.max_age_seconds
+
+    def save(self):
+        """
+        Atomically write the library to disk
+
+        Failures are logged rather than raised; the in-memory library is
+        still usable and the next save retries.
+        """
+        if not self.persist:
+            return
+        with self._lock:
+            tmp_path = None
+            try:
+                directory = os.path.dirname(self.path) or '.'
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.enrichment-', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'entries': self.entries}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Could not save enrichment library: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def lookup(self, topic: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached enrichment for a topic, or None
+
+        Stale entries count as misses so the caller regenerates (refreshes) them.
+        """
+        name = normalize_name(topic.get('topic', ''))
+        concepts = {normalize_name(c) for c in topic.get('concepts', [])}
+
+        with self._lock:
+            entry = self.entries.get(self.make_key(topic.get('topic', ''), topic.get('concepts', [])))
+
+            if entry is None:
+                candidates = set()
+                for concept in concepts:
+                    candidates |= self.concept_index.get(concept, set())
+                best_similarity = self.similarity_threshold
+                for key in candidates:
+                    candidate = self.entries[key]
+                    if candidate['name'] != name:
+                        continue
+                    similarity = jaccard(concepts, candidate['concepts'])
+                    if similarity >= best_similarity:
+                        entry, best_similarity = candidate, similarity
+
+            if entry is not None and not self._is_fresh(entry):
+                self.stale += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return {
+                'topic': topic.get('topic', ''),
+                'resources': entry.get('resources', []),
+                'project_ideas': entry.get('project_ideas', [])
+            }
+
+    def store_many(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Store (topic, enrichment) pairs and persist the library once"""
+        if not items:
+            return
+        with self._lock:
+            for topic, enrichment in items:
+                key = self.make_key(topic.get('topic', ''), topic.get('concepts', []))
+                previous = self.entries.get(key)
+                if previous is not None:
+                    self._unindex(key, previous)
+                entry = {
+                    'name': normalize_name(topic.get('topic', '')),
+                    'concepts': sorted({normalize_name(c) for c in topic.get('concepts', [])}),
+                    'resources': enrichment.get('resources', []),
+                    'project_ideas': enrichment.get('project_ideas', []),
+                    'created_at': time.time()
+                }
+                self.entries[key] = entry
+                self._index(key, entry)
+        self.save()
+
+    def evict_older_than(self, max_age_seconds: Optional[float], save: bool = True) -> int:
+        """Remove entries older than max_age_seconds, returning how many were removed"""
+        if max_age_seconds is None:
+            return 0
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            expired = [key for key, entry in self.entries.items() if entry.get('created_at', 0) < cutoff]
+            for key in expired:
+                self._unindex(key, self.entries.pop(key))
+        if expired and save:
+            self.save()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'concepts_indexed': len(self.concept_index),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
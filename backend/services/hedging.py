@@ -0,0 +1,178 @@
+# backend/services/hedging.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeout, wait
+from typing import Callable, Dict, Any, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class RequestHedger:
+    """
+    Duplicates slow calls to cut tail latency
+
+    Latencies are tracked per tag (one tag per agent). When a call has not
+    returned after the tag's recent latency percentile, an identical hedge
+    call is fired and whichever finishes first wins. Hedges are capped at
+    max_hedge_rate of all calls to bound the extra cost.
+
+    Attempts run on a pool of max_workers threads; when it is busy, calls run
+    inline without hedging rather than queueing behind other requests. The
+    losing attempt is cancelled if it has not started yet; otherwise its
+    abandon event is set so a streaming call can close its connection, and
+    whatever it consumed is reported as wasted tokens (and to the caller).
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        max_hedge_rate: float = 0.1,
+        window: int = 200,
+        max_workers: int = 16
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.max_workers = max_workers
+        self.latencies: Dict[str, deque] = {}
+        self.calls = 0
+        self.hedges_issued = 0
+        self.hedges_won = 0
+        self.unhedged_busy = 0
+        self.wasted_tokens = 0
+        self._busy_workers = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+    def hedge_delay(self, tag: str) -> Optional[float]:
+        """Return the tag's latency percentile, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self.latencies.get(tag, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(self.percentile * (len(samples) - 1))]
+
+    def _record(self, tag: str, seconds: float):
+        with self._lock:
+            self.latencies.setdefault(tag, deque(maxlen=self.window)).append(seconds)
+
+    def _timed(self, tag: str, fn: Callable[[threading.Event], T], abandon: threading.Event) -> Callable[[], T]:
+        def run() -> T:
+            started = time.monotonic()
+            result = fn(abandon)
+            # An abandoned attempt stopped early; its latency says nothing
+            if not abandon.is_set():
+                self._record(tag, time.monotonic() - started)
+            return result
+        return run
+
+    def _reserve_worker(self) -> bool:
+        with self._lock:
+            if self._busy_workers >= self.max_workers:
+                return False
+            self._busy_workers += 1
+            return True
+
+    def _release_worker(self, _future=None):
+        with self._lock:
+            self._busy_workers -= 1
+
+    def _submit(self, tag: str, fn: Callable[[threading.Event], T], abandon: threading.Event):
+        """Run an attempt on a worker reserved by the caller"""
+        future = self._executor.submit(self._timed(tag, fn, abandon))
+        future.add_done_callback(self._release_worker)
+        return future
+
+    def _take_hedge_slot(self) -> bool:
+        with self._lock:
+            if self.hedges_issued + 1 > self.max_hedge_rate * self.calls:
+                return False
+            if self._busy_workers >= self.max_workers:
+                self.unhedged_busy += 1
+                return False
+            self._busy_workers += 1
+            self.hedges_issued += 1
+            return True
+
+    def _discard(self, future, abandon: threading.Event, on_wasted: Optional[Callable[[Any], None]]):
+        """Cancel a losing attempt, or stop it and count its tokens once it returns"""
+        if future.cancel():
+            return
+        abandon.set()
+
+        def count_waste(done):
+            if done.exception() is None:
+                usage = getattr(done.result(), 'usage', None)
+                if usage is not None:
+                    with self._lock:
+                        self.wasted_tokens += usage.total_tokens
+                    if on_wasted is not None:
+                        on_wasted(usage)
+
+        future.add_done_callback(count_waste)
+
+    def call(
+        self,
+        tag: str,
+        fn: Callable[[threading.Event], T],
+        on_wasted: Optional[Callable[[Any], None]] = None
+    ) -> T:
+        """
+        Run fn, hedging it if it runs longer than usual for this tag
+
+        fn is called with an event that is set once its attempt has lost, so
+        a streaming call can stop reading and close its response. on_wasted
+        receives the losing attempt's usage, e.g. to charge it to a budget.
+        """
+        with self._lock:
+            self.calls += 1
+
+        delay = self.hedge_delay(tag)
+        if delay is None:
+            return self._timed(tag, fn, threading.Event())()
+        if not self._reserve_worker():
+            with self._lock:
+                self.unhedged_busy += 1
+            return self._timed(tag, fn, threading.Event())()
+
+        primary_abandon = threading.Event()
+        primary = self._submit(tag, fn, primary_abandon)
+        try:
+            return primary.result(timeout=delay)
+        except FuturesTimeout:
+            pass
+
+        if not self._take_hedge_slot():
+            return primary.result()
+
+        hedge_abandon = threading.Event()
+        hedge = self._submit(tag, fn, hedge_abandon)
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        first = primary if primary in done else hedge
+        other = hedge if first is primary else primary
+
+        # If the first finisher failed, the other attempt decides the outcome
+        if first.exception() is not None:
+            return other.result()
+
+        if first is hedge:
+            with self._lock:
+                self.hedges_won += 1
+        self._discard(other, hedge_abandon if other is hedge else primary_abandon, on_wasted)
+        return first.result()
+
+    def stats(self) -> Dict[str, Any]:
+        delays = {tag: self.hedge_delay(tag) for tag in list(self.latencies)}
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges_issued': self.hedges_issued,
+                'hedges_won': self.hedges_won,
+                'unhedged_busy': self.unhedged_busy,
+                'hedge_rate': self.hedges_issued / self.calls if self.calls else 0.0,
+                'wasted_tokens': self.wasted_tokens,
+                'hedge_delay_seconds': delays
+            }
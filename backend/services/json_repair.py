@@ -0,0 +1,168 @@
+# backend/services/json_repair.py
+import json
+from typing import Any, List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _json_start(text: str) -> int:
+    """Index of the first { or [, skipping code fences and chatter"""
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError("Could not parse response as JSON")
+    return min(starts)
+
+
+def _scan(text: str) -> Tuple[str, List[Tuple[int, Tuple[str, ...]]], Tuple[str, ...], bool]:
+    """
+    Walk a JSON document, dropping trailing commas
+
+    Returns the cleaned text, the places it could be cut as (index, open
+    containers at that index), the containers still open at the end and
+    whether the text ends inside a string.
+    """
+    out = []
+    cuts = []
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+
+    for i, char in enumerate(text):
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+            out.append(char)
+            cuts.append((len(out), tuple(stack)))
+            continue
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            out.append(char)
+            cuts.append((len(out), tuple(stack)))
+            if not stack:
+                break
+            continue
+        elif char == ',':
+            following = text[i + 1:].lstrip()[:1]
+            if following in ('}', ']'):
+                continue
+            cuts.append((len(out), tuple(stack)))
+        out.append(char)
+
+    return "".join(out), cuts, tuple(stack), in_string
+
+
+def _leaves_partial_element(stack: Tuple[str, ...]) -> bool:
+    """True if cutting here would keep a half-written object inside an array"""
+    return any(outer == '[' and inner == '{' for outer, inner in zip(stack, stack[1:]))
+
+
+def is_truncated(text: str) -> bool:
+    """Whether a reply stops before its top-level JSON value is closed"""
+    try:
+        text = text[_json_start(text):]
+    except ValueError:
+        return False
+    _, _, stack, in_string = _scan(text)
+    return bool(stack) or in_string
+
+
+def repair_json(text: str) -> Tuple[Any, bool]:
+    """
+    Parse a model reply as JSON, repairing it locally if needed
+
+    Surrounding prose and code fences are ignored and trailing commas are
+    dropped. A truncated document is cut back to its last complete element
+    (a half-written object inside an array is dropped entirely, a partial
+    root object keeps its completed keys) and its open containers are closed.
+
+    Returns:
+        (parsed value, whether a repair was needed)
+    """
+    text = (text or '').strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    start = _json_start(text)
+    try:
+        return _DECODER.raw_decode(text, start)[0], True
+    except json.JSONDecodeError:
+        pass
+
+    cleaned, cuts, stack, in_string = _scan(text[start:])
+    candidates = []
+    if not in_string:
+        candidates.append((len(cleaned), stack))
+    candidates.extend(reversed(cuts))
+
+    for index, open_containers in candidates:
+        if _leaves_partial_element(open_containers):
+            continue
+        closing = "".join(_CLOSERS[c] for c in reversed(open_containers))
+        try:
+            return json.loads(cleaned[:index].rstrip().rstrip(',') + closing), True
+        except json.JSONDecodeError:
+            continue
+
+    raise ValueError("Could not parse response as JSON")
+
+
+def validate_output(schema: Type[BaseModel], data: Any, max_drops: int = 20) -> Any:
+    """
+    Coerce parsed output with an agent's schema
+
+    A list item with a field that still fails coercion (e.g. a difficulty of
+    "N/A") keeps the item and loses that field. Items missing a required
+    field (e.g. a topic cut short by truncation) or of the wrong type are
+    dropped rather than failing the whole reply. Only fields present in the
+    reply are returned, so callers merging the result into existing data
+    don't get defaults written over it.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+
+    for _ in range(max_drops + 1):
+        try:
+            return schema.model_validate(data).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            invalid_items = set()
+            invalid_fields = set()
+            for error in e.errors():
+                loc = error['loc']
+                if len(loc) < 2 or not isinstance(loc[1], int) or not isinstance(data.get(loc[0]), list):
+                    continue
+                item = data[loc[0]][loc[1]]
+                if len(loc) >= 3 and error['type'] != 'missing' and isinstance(item, dict) and loc[2] in item:
+                    invalid_fields.add((loc[0], loc[1], loc[2]))
+                else:
+                    invalid_items.add((loc[0], loc[1]))
+            if not invalid_items and not invalid_fields:
+                raise ValueError(f"Response does not match {schema.__name__}: {e}") from e
+
+            data = {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
+            for field, index, key in sorted(invalid_fields):
+                if (field, index) not in invalid_items:
+                    print(f"Dropping invalid {key} of {field}[{index}] in {schema.__name__}")
+                    data[field][index] = {k: v for k, v in data[field][index].items() if k != key}
+            for field, index in sorted(invalid_items, reverse=True):
+                print(f"Dropping invalid {field}[{index}] in {schema.__name__}")
+                del data[field][index]
+
+    raise ValueError(f"Response does not match {schema.__name__}")
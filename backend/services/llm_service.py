@@ -1,11 +1,33 @@
 import os
-from groq import Groq
-from typing import Optional
-import json
+import threading
+from groq import Groq, BadRequestError
+from typing import Optional, Dict, Any, List, Tuple
 from dotenv import load_dotenv
+from .budget import RequestBudget, RequestCancelled
+from .tracing import tracer
+from .hedging import RequestHedger
+from .rate_limit import SharedRateLimiter
+from .json_repair import repair_json
 
 load_dotenv()
 
+
+class _Usage:
+    """Token counts in the shape of a completion's usage"""
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class _StreamedCompletion:
+    """A streamed completion collected into its text, finish reason and usage"""
+    def __init__(self, content: str, finish_reason: Optional[str], usage: Optional[_Usage]):
+        self.content = content
+        self.finish_reason = finish_reason
+        self.usage = usage
+
+
 class LLMService:
     """Service for interacting with GROQ LLM"""
     def __init__(self, model: str="llama-3.1-70b-versatile"):
@@ -15,6 +37,25 @@ class LLMService:
             raise ValueError("GROQ_API_KEY not found in env variables")
         self.client= Groq(api_key=self.api_key)
         self.model = model
+        self.rate_limiter: Optional[SharedRateLimiter] = None
+
+        # Optional request hedging against provider tail latency
+        self.hedger = None
+        if os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true":
+            self.hedger = RequestHedger(
+                percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+                min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+                max_hedge_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1")),
+                max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+            )
+
+        # Cancellation accounting; tokens saved are estimated from each tag's
+        # average completion size
+        self._stats_lock = threading.Lock()
+        self._completion_tokens: Dict[str, Tuple[int, int]] = {}
+        self.cancelled_calls = 0
+        self.skipped_calls = 0
+        self.tokens_saved = 0
 
     def generate(
         self,
@@ -22,9 +63,21 @@ class LLMService:
         system_prompt : Optional[str]=None,
         temperature: float = 0.7,
         max_tokens: int =4000,
-        json_mode: bool =False
+        json_mode: bool =False,
+        budget: Optional[RequestBudget]=None,
+        tag: str ="default",
+        cancellable: bool =True
     ) -> str:
-        """Generates a response from the Groq LLM"""
+        """Generates a response from the Groq LLM
+
+        tag groups calls (one per agent) for hedging latency statistics.
+        When the budget carries a cancel event and the call is cancellable,
+        the response is streamed and abandoned as soon as the client
+        disconnects. Pass cancellable=False for calls whose result outlives
+        the request (e.g. shared caches). With hedging enabled every call is
+        streamed so a losing attempt can be closed; its tokens are charged
+        to the budget as well.
+        """
 
         messages = []
 
@@ -39,46 +92,204 @@ class LLMService:
             "content": prompt
         })
 
+        content, _ = self.chat(
+            messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=json_mode,
+            budget=budget,
+            tag=tag,
+            cancellable=cancellable
+        )
+        return content
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int =4000,
+        json_mode: bool =False,
+        budget: Optional[RequestBudget]=None,
+        tag: str ="default",
+        cancellable: bool =True
+    ) -> Tuple[str, str]:
+        """Sends a full message list, as generate does for a single prompt
+
+        Returns:
+            (content, finish_reason); finish_reason is "length" when the
+            reply hit max_tokens and "json_validate_failed" when Groq
+            rejected a JSON mode reply (content is then the rejected text)
+        """
+        cancellable = cancellable and budget is not None and budget.cancellable
+        if cancellable and budget.cancelled:
+            self._record_cancel(tag, skipped=True, prompt_chars=sum(len(m["content"]) for m in messages))
+            raise RequestCancelled("Client disconnected")
+
+        # Groq cannot stream JSON mode; cancellable calls, and all calls when
+        # hedging (so a losing attempt can be closed), stream plain text and
+        # rely on the caller's local JSON repair instead
+        stream = cancellable or self.hedger is not None
+        prompt_chars = len(messages[-1]["content"])
+
+        with tracer.span("llm.generate", model=self.model, tag=tag, json_mode=json_mode, stream=stream, prompt_chars=prompt_chars) as span:
+            try:
+                def create(abandon: Optional[threading.Event] = None):
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.acquire()
+                    if stream:
+                        return self._stream(messages, temperature, max_tokens, budget if cancellable else None, tag, abandon)
+                    return self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        response_format={"type":"json_object"} if json_mode else {"type":"text"}
+                    )
+
+                if self.hedger is not None:
+                    # The losing attempt's tokens were spent on this request too
+                    on_wasted = (lambda usage: budget.charge(usage.total_tokens)) if budget is not None else None
+                    completion = self.hedger.call(tag, create, on_wasted=on_wasted)
+                else:
+                    completion = create()
+
+                if completion.usage is not None:
+                    span.set_attributes(
+                        prompt_tokens=completion.usage.prompt_tokens,
+                        completion_tokens=completion.usage.completion_tokens
+                    )
+                    if budget is not None:
+                        budget.charge(completion.usage.total_tokens)
+                    self._record_completion(tag, completion.usage.completion_tokens)
+
+                if stream:
+                    content, finish_reason = completion.content, completion.finish_reason
+                else:
+                    content, finish_reason = completion.choices[0].message.content, completion.choices[0].finish_reason
+                span.set_attribute("finish_reason", finish_reason)
+                return content, finish_reason
+            
+            except RequestCancelled:
+                span.set_attribute("cancelled", True)
+                raise
+            except BadRequestError as e:
+                # JSON mode replies that fail Groq's validation (often because
+                # they were cut off) come back as errors carrying the text
+                error = e.body.get('error', e.body) if isinstance(e.body, dict) else {}
+                if isinstance(error, dict) and error.get('failed_generation'):
+                    span.set_attribute("finish_reason", "json_validate_failed")
+                    return error['failed_generation'], "json_validate_failed"
+                print(f"Error calling Groq API:{e}")
+                raise
+            except Exception as e:
+                print(f"Error calling Groq API:{e}")
+                raise
+
+    def _stream(
+        self,
+        messages: list,
+        temperature: float,
+        max_tokens: int,
+        budget: Optional[RequestBudget],
+        tag: str,
+        abandon: Optional[threading.Event] = None
+    ) -> _StreamedCompletion:
+        """
+        Stream a completion, closing the connection if the request is cancelled
+
+        budget is only used for cancellation; it is None for calls that must
+        finish even if the client disconnects.
+
+        When a hedged duplicate wins, abandon is set and the partial reply is
+        returned with an estimate of the tokens it consumed.
+        """
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+
+        parts = []
+        chunks = 0
+        finish_reason = None
+        usage = None
         try:
-            completion= self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                response_format={"type":"json_object"} if json_mode else {"type":"text"}
-            )
+            for chunk in response:
+                if budget is not None and budget.cancelled:
+                    self._record_cancel(tag, streamed_tokens=chunks)
+                    raise RequestCancelled("Client disconnected")
+                if abandon is not None and abandon.is_set():
+                    # Roughly four characters per prompt token, one token per chunk
+                    usage = _Usage(sum(len(m["content"]) for m in messages) // 4, chunks)
+                    finish_reason = "abandoned"
+                    break
+                chunks += 1
+                if chunk.choices:
+                    if chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, 'x_groq', None)
+                if isinstance(x_groq, dict) and x_groq.get('usage'):
+                    usage = _Usage(x_groq['usage'].get('prompt_tokens', 0), x_groq['usage'].get('completion_tokens', 0))
+        finally:
+            response.close()
 
-            return completion.choices[0].message.content
-        
-        except Exception as e:
-            print(f"Error calling Groq API:{e}")
-            raise
+        return _StreamedCompletion("".join(parts), finish_reason, usage)
+
+    def _record_completion(self, tag: str, completion_tokens: Optional[int]):
+        if completion_tokens is None:
+            return
+        with self._stats_lock:
+            calls, tokens = self._completion_tokens.get(tag, (0, 0))
+            self._completion_tokens[tag] = (calls + 1, tokens + completion_tokens)
+
+    def _record_cancel(self, tag: str, skipped: bool = False, prompt_chars: int = 0, streamed_tokens: int = 0):
+        """Count a cancelled call and the tokens it would have cost"""
+        with self._stats_lock:
+            calls, tokens = self._completion_tokens.get(tag, (0, 0))
+            expected_completion = tokens // calls if calls else 0
+            if skipped:
+                self.skipped_calls += 1
+                # Roughly four characters per prompt token
+                self.tokens_saved += prompt_chars // 4 + expected_completion
+            else:
+                self.cancelled_calls += 1
+                self.tokens_saved += max(0, expected_completion - streamed_tokens)
             
     def generate_json(
             self,
             prompt: str,
             system_prompt: Optional[str]=None,
-            temperature: float=0.7
+            temperature: float=0.7,
+            budget: Optional[RequestBudget]=None
     ) -> dict:
         """Generates JSON respone
 
         Returns:
-            Parsed Json dict
+            Parsed Json dict, repaired locally if the reply was malformed
         """
         response = self.generate(
             prompt=prompt,
             system_prompt=system_prompt,
             temperature=temperature,
-            json_mode=True
+            json_mode=True,
+            budget=budget
         )
 
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            #try to extract JSON from response
-            start=response.find('{')
-            end=response.rfind('}')+1
-            if start!=-1 and end!=0 :
-                return json.loads(response[start:end])
-            raise ValueError("Could not parse JSON response")
+        return repair_json(response)[0]
+
+    def stats(self) -> dict:
+        """Hedging statistics, or None when hedging is disabled"""
+        return self.hedger.stats() if self.hedger is not None else None
 
+    def cancellation_stats(self) -> Dict[str, Any]:
+        """Calls aborted in flight or never started after a client disconnect"""
+        with self._stats_lock:
+            return {
+                'cancelled_calls': self.cancelled_calls,
+                'skipped_calls': self.skipped_calls,
+                'estimated_tokens_saved': self.tokens_saved
+            }
@@ -0,0 +1,348 @@
+# backend/services/prompt_encoding.py
+"""
+Compact, token-budgeted prompt encoding for roadmaps and topic listings
+
+Roadmaps are rendered as a table (one row per topic id, edges as id lists)
+instead of JSON, which removes repeated keys and quoting. Ids that aren't
+plain tokens, and names used as references, are written as JSON strings so
+separators inside them stay unambiguous. When a per-agent
+input budget is set, low-value fields are shortened step by step until the
+rendering fits; topic ids, names, edges and the learning path are never
+elided.
+"""
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from models.serialization import dumps_compact
+from .tracing import tracer
+
+ELLIPSIS = "…"
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\n|[ \t]{2,}")
+_PLAIN_REF = re.compile(r"^[A-Za-z0-9_.\-]+$")
+_REF_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[A-Za-z0-9_.\-]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate
+
+    About one token per 4 word or whitespace-run characters, one per symbol
+    or newline; single spaces ride along with the following word.
+    """
+    return sum(
+        (len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] in '_ \t' else 1
+        for piece in _TOKEN_PATTERN.findall(text or '')
+    )
+
+
+class _Elision(NamedTuple):
+    name: str
+    resource_descriptions: bool = True
+    resources: bool = True
+    description_chars: Optional[int] = None
+    max_concepts: Optional[int] = None
+    max_projects: Optional[int] = None
+    project_chars: Optional[int] = None
+
+
+# Progressively cheaper renderings, tried in order until one fits the budget
+_ELISION_LEVELS = [
+    _Elision("none"),
+    _Elision("resource descriptions", resource_descriptions=False),
+    _Elision("resource descriptions, long text", resource_descriptions=False,
+             description_chars=240, project_chars=120),
+    _Elision("resource descriptions, text, lists", resource_descriptions=False,
+             description_chars=120, max_concepts=6, max_projects=2, project_chars=60),
+    _Elision("resources, text, lists", resources=False,
+             description_chars=60, max_concepts=4, max_projects=1, project_chars=40),
+    _Elision("everything but ids, names and edges", resources=False,
+             description_chars=0, max_concepts=3, max_projects=0)
+]
+
+
+def _cell(value: Any) -> str:
+    """Flatten a value into one table cell"""
+    return " ".join(str(value if value is not None else '').split()).replace("|", "/")
+
+
+def _name(value: Any) -> str:
+    """Ids and topic names are matched on the way back, so only whitespace is normalized"""
+    return " ".join(str(value if value is not None else '').split())
+
+
+def _ref(value: Any) -> str:
+    """A topic reference: bare if it is a plain token, otherwise a JSON string"""
+    value = _name(value)
+    return value if _PLAIN_REF.match(value) else json.dumps(value, ensure_ascii=False)
+
+
+def _parse_refs(text: str) -> List[str]:
+    return [json.loads(ref) if ref.startswith('"') else ref for ref in _REF_PATTERN.findall(text)]
+
+
+def _shorten(text: Any, limit: Optional[int]) -> str:
+    text = _cell(text)
+    if limit is None or len(text) <= limit:
+        return text
+    if limit == 0:
+        return ""
+    return text[:limit].rstrip() + ELLIPSIS
+
+
+def _limit(items: Sequence[Any], count: Optional[int]) -> Tuple[List[Any], int]:
+    items = list(items or [])
+    if count is None or len(items) <= count:
+        return items, 0
+    return items[:count], len(items) - count
+
+
+def _topic_key(topic: Dict[str, Any]) -> str:
+    return topic.get('id') or topic.get('topic', '')
+
+
+def _edges(roadmap: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """(topic key, prerequisite keys) in topic order; outside names are kept as is"""
+    topics = roadmap.get('topics', [])
+    ids_by_name = {t.get('topic'): _topic_key(t) for t in topics}
+    dependencies = roadmap.get('dependencies', {})
+
+    edges = []
+    for topic in topics:
+        names = list(dependencies.get(topic.get('topic'), [])) + list(topic.get('prerequisites') or [])
+        refs = list(dict.fromkeys(_name(ids_by_name.get(name) or name) for name in names))
+        if refs:
+            edges.append((_name(_topic_key(topic)), refs))
+    return edges
+
+
+def _render_topic(topic: Dict[str, Any], elision: _Elision) -> List[str]:
+    concepts, more_concepts = _limit(topic.get('concepts'), elision.max_concepts)
+    row = " | ".join([
+        _ref(_topic_key(topic)),
+        _ref(topic.get('topic')) if "|" in _name(topic.get('topic')) else _name(topic.get('topic')),
+        _cell(topic.get('difficulty_label')),
+        _cell(topic.get('category')),
+        _cell(topic.get('time_estimate')),
+        "; ".join(_cell(c) for c in concepts) + (f"; +{more_concepts} more" if more_concepts else "")
+    ])
+    lines = [row]
+
+    description = _shorten(topic.get('description'), elision.description_chars)
+    if description:
+        lines.append(f"  description: {description}")
+
+    resources = topic.get('resources') or []
+    if resources and elision.resources:
+        rendered = []
+        for resource in resources:
+            if not isinstance(resource, dict):
+                rendered.append(_cell(resource))
+                continue
+            item = f"[{_cell(resource.get('type'))}] {_cell(resource.get('title'))}"
+            if elision.resource_descriptions and resource.get('description'):
+                item += f" - {_cell(resource['description'])}"
+            rendered.append(item)
+        lines.append("  resources: " + "; ".join(rendered))
+    elif resources:
+        lines.append(f"  resources: {len(resources)} (omitted)")
+
+    projects, more_projects = _limit(topic.get('project_ideas'), elision.max_projects)
+    if projects or more_projects:
+        rendered = [_shorten(p, elision.project_chars) for p in projects]
+        if more_projects:
+            rendered.append(f"+{more_projects} more")
+        lines.append("  projects: " + "; ".join(rendered))
+    return lines
+
+
+def _render_roadmap(roadmap: Dict[str, Any], elision: _Elision) -> str:
+    topics = roadmap.get('topics', [])
+    ids_by_name = {t.get('topic'): _topic_key(t) for t in topics}
+
+    lines = [
+        f"TITLE: {_cell(roadmap.get('title'))}",
+        f"OVERVIEW: {_cell(roadmap.get('overview'))}",
+        f"TOTAL TIME: {_cell(roadmap.get('total_time_estimate'))}",
+        "",
+        "TOPICS (id | topic | difficulty | category | time | concepts)"
+    ]
+    for topic in topics:
+        lines.extend(_render_topic(topic, elision))
+
+    lines.extend(["", "EDGES (topic id <- prerequisite ids; quoted names not in TOPICS are outside the roadmap)"])
+    lines.extend(
+        f"{_ref(topic_id)} <- {', '.join(_ref(ref) for ref in refs)}"
+        for topic_id, refs in _edges(roadmap)
+    )
+
+    path = [_ref(ids_by_name.get(name) or name) for name in roadmap.get('learning_path', [])]
+    lines.extend(["", "LEARNING PATH: " + " > ".join(path)])
+
+    if elision.name != "none":
+        lines.append(f"(Text ending in {ELLIPSIS} and \"+N more\" entries were shortened to save space.)")
+    return "\n".join(lines)
+
+
+def _missing_ids_and_edges(text: str, roadmap: Dict[str, Any]) -> List[str]:
+    """
+    Topic ids and prerequisite edges of the roadmap absent from an encoding
+
+    Checked against the raw topics and dependencies rather than the
+    renderer's own edge list, so a rendering bug cannot hide a dropped edge.
+    """
+    topics = roadmap.get('topics', [])
+    ids_by_name = {t.get('topic'): _name(_topic_key(t)) for t in topics}
+    rows = set()
+    edges = {}
+    for line in text.splitlines():
+        key = _REF_PATTERN.match(line)
+        if key is None:
+            continue
+        rest = line[key.end():]
+        if rest.startswith(" | "):
+            rows.add(_parse_refs(key.group())[0])
+        elif rest.startswith(" <- "):
+            edges[_parse_refs(key.group())[0]] = set(_parse_refs(rest[len(" <- "):]))
+
+    missing = [ids_by_name[t.get('topic')] for t in topics if ids_by_name[t.get('topic')] not in rows]
+    dependencies = roadmap.get('dependencies', {})
+    for topic in topics:
+        topic_id = ids_by_name[topic.get('topic')]
+        names = list(dependencies.get(topic.get('topic'), [])) + list(topic.get('prerequisites') or [])
+        for name in dict.fromkeys(names):
+            ref = ids_by_name.get(name) or _name(name)
+            if ref not in edges.get(topic_id, ()):
+                missing.append(f"{topic_id} <- {ref}")
+    return missing
+
+
+def _fit(render, elision_levels: Sequence[_Elision], max_tokens: Optional[int]) -> Tuple[str, int, _Elision]:
+    for elision in elision_levels:
+        text = render(elision)
+        tokens = estimate_tokens(text)
+        if max_tokens is None or tokens <= max_tokens:
+            break
+    return text, tokens, elision
+
+
+def _report(label: str, span, tokens_before: int, tokens_after: int, elision: _Elision, max_tokens: Optional[int]):
+    span.set_attributes(tokens_before=tokens_before, tokens_after=tokens_after, elided=elision.name)
+    note = f", elided {elision.name}" if elision.name != "none" else ""
+    print(f"     {label} prompt: ~{tokens_before} -> ~{tokens_after} tokens{note}")
+    if max_tokens is not None and tokens_after > max_tokens:
+        print(f"     {label} prompt is still over its {max_tokens} token budget")
+
+
+def encode_roadmap(roadmap: Dict[str, Any], max_tokens: Optional[int] = None, label: str = "roadmap") -> str:
+    """
+    Render a roadmap as a compact table within max_tokens (estimated)
+
+    Every topic id and prerequisite edge is present at every elision level.
+    """
+    with tracer.span("prompt.encode", label=label, topics=len(roadmap.get('topics', []))) as span:
+        text, tokens, elision = _fit(lambda e: _render_roadmap(roadmap, e), _ELISION_LEVELS, max_tokens)
+        _report(label, span, estimate_tokens(dumps_compact(roadmap)), tokens, elision, max_tokens)
+        return text
+
+
+def encode_topics(
+    topics: List[Dict[str, Any]],
+    columns: Sequence[str],
+    max_tokens: Optional[int] = None,
+    label: str = "topics",
+    max_concepts: Optional[int] = None
+) -> str:
+    """
+    Render a topic listing as a header plus one row per topic
+
+    columns are topic fields; 'topic' (the name) is never shortened, while
+    'concepts' and 'description' are trimmed as needed to fit max_tokens.
+    """
+    def render(elision: _Elision) -> str:
+        limits = [n for n in (elision.max_concepts, max_concepts) if n is not None]
+        concept_limit = min(limits) if limits else None
+        rows = [" | ".join(columns)]
+        for topic in topics:
+            cells = []
+            for column in columns:
+                value = topic.get(column)
+                if column == 'concepts':
+                    concepts, more = _limit(value, concept_limit)
+                    cells.append("; ".join(_cell(c) for c in concepts) + (f"; +{more} more" if more else ""))
+                elif column == 'description':
+                    cells.append(_shorten(value, elision.description_chars))
+                elif column in ('id', 'topic'):
+                    cells.append(_name(value))
+                else:
+                    cells.append(_cell(value))
+            rows.append(" | ".join(cells))
+        return "\n".join(rows)
+
+    with tracer.span("prompt.encode", label=label, topics=len(topics)) as span:
+        text, tokens, elision = _fit(render, _ELISION_LEVELS, max_tokens)
+        _report(label, span, estimate_tokens(dumps_compact(topics)), tokens, elision, max_tokens)
+        return text
+
+
+def _shortened_from(value: Any, original: Any) -> bool:
+    """Whether value is original as it appeared after elision"""
+    if not isinstance(value, str) or not isinstance(original, str) or value == original:
+        return False
+    stem = value.rstrip().rstrip(ELLIPSIS).rstrip()
+    return value.rstrip().endswith(ELLIPSIS) and (_cell(original).startswith(stem) or _name(original).startswith(stem))
+
+
+def restore_elided(original_topics: List[Dict[str, Any]], refined_topics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Put back content a model only saw shortened, matching topics by id
+
+    Fields the reply left out or returned in their elided form are taken from
+    the original topic, resource descriptions are restored by title, and
+    prerequisites given as topic ids are mapped back to names.
+    """
+    originals = {topic.get('id'): topic for topic in original_topics if topic.get('id')}
+    names_by_id = {topic_id: topic.get('topic') for topic_id, topic in originals.items()}
+
+    restored = []
+    for topic in refined_topics:
+        original = originals.get(topic.get('id'))
+        if original is None:
+            restored.append(topic)
+            continue
+
+        topic = dict(topic)
+        for field, value in original.items():
+            if topic.get(field) in (None, ''):
+                topic[field] = value
+
+        if _shortened_from(topic.get('description'), original.get('description')):
+            topic['description'] = original['description']
+
+        original_concepts = list(original.get('concepts') or [])
+        concepts = list(topic.get('concepts') or [])
+        if len(concepts) < len(original_concepts) and original_concepts[:len(concepts)] == concepts:
+            topic['concepts'] = original_concepts
+
+        original_projects = list(original.get('project_ideas') or [])
+        topic['project_ideas'] = [
+            next((o for o in original_projects if _shortened_from(p, o)), p)
+            for p in topic.get('project_ideas') or []
+        ]
+
+        original_resources = {
+            r.get('title'): r for r in original.get('resources') or [] if isinstance(r, dict)
+        }
+        topic['resources'] = [
+            {**original_resources[r['title']], **r}
+            if isinstance(r, dict) and r.get('title') in original_resources and not r.get('description')
+            else r
+            for r in topic.get('resources') or []
+        ]
+
+        if topic.get('prerequisites'):
+            topic['prerequisites'] = [names_by_id.get(p, p) for p in topic['prerequisites']]
+
+        restored.append(topic)
+    return restored
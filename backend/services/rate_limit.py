@@ -0,0 +1,28 @@
+# backend/services/rate_limit.py
+import multiprocessing
+import time
+
+
+class SharedRateLimiter:
+    """
+    Request-rate budget shared by threads and worker processes
+
+    Calls are spaced evenly at requests_per_minute. The next free slot lives
+    in shared memory, so every process created with this limiter draws from
+    the same budget.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = multiprocessing.Value('d', 0.0, lock=False)
+        self._lock = multiprocessing.Lock()
+
+    def acquire(self):
+        """Block until the caller may issue one request"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,70 @@
+# backend/services/roadmap_store.py
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+
+_DOCUMENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+
+class RoadmapStore:
+    """
+    File-based store of roadmap versions per source document
+
+    Each version is written to <directory>/<document_id>/v<version>.json and
+    records the section hashes of the text it was generated from, the ids of
+    the roadmap topics each section produced and the resulting roadmap.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _document_dir(self, document_id: str) -> str:
+        if not _DOCUMENT_ID_PATTERN.match(document_id) or document_id.strip('.') == '':
+            raise ValueError(f"Invalid document id: {document_id}")
+        return os.path.join(self.directory, document_id)
+
+    def _versions(self, document_id: str) -> list:
+        document_dir = self._document_dir(document_id)
+        if not os.path.isdir(document_dir):
+            return []
+        versions = []
+        for filename in os.listdir(document_dir):
+            match = re.match(r'^v(\d+)\.json$', filename)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def load(self, document_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Load a version (the latest by default), or None if there is none"""
+        if version is None:
+            versions = self._versions(document_id)
+            if not versions:
+                return None
+            version = versions[-1]
+
+        path = os.path.join(self._document_dir(document_id), f"v{version}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, document_id: str, record: Dict[str, Any]) -> int:
+        """Store record as the next version and return its version number"""
+        document_dir = self._document_dir(document_id)
+        with self._lock:
+            os.makedirs(document_dir, exist_ok=True)
+            versions = self._versions(document_id)
+            version = versions[-1] + 1 if versions else 1
+
+            record = {**record, 'document_id': document_id, 'version': version, 'created_at': time.time()}
+            path = os.path.join(document_dir, f"v{version}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)
+
+        return version
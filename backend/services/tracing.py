@@ -0,0 +1,183 @@
+# backend/services/tracing.py
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+
+class Span:
+    """A timed unit of work within a request trace"""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional['Span'] = None, collect: bool = False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = 'ok'
+        # Only the root span of a profiled request collects its trace
+        self.collected: Optional[List['Span']] = [] if collect else (parent.collected if parent else None)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_time': self.start_time,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class FileSpanExporter:
+    """Appends finished spans to a local JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporter"""
+
+    def __init__(self, exporter: Optional[FileSpanExporter] = None):
+        self.exporter = exporter
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, collect: bool = False, **attributes):
+        """
+        Open a child span of the current span (or a new trace)
+
+        collect=True makes the span keep every finished span of its trace
+        in span.collected, which is what the profiling report is built from.
+        """
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        span = Span(name, trace_id, parent=parent, collect=collect)
+        span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.set_attribute('error', str(e))
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            if span.collected is not None:
+                with self._lock:
+                    span.collected.append(span)
+            if self.exporter is not None:
+                try:
+                    self.exporter.export(span)
+                except OSError as e:
+                    print(f"Could not export span: {e}")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _create_tracer() -> Tracer:
+    if os.getenv("TRACING_ENABLED", "false").lower() != "true":
+        return Tracer()
+    return Tracer(FileSpanExporter(os.getenv("TRACE_EXPORT_PATH", "traces/spans.jsonl")))
+
+
+tracer = _create_tracer()
+
+
+# Span names that make up each wall-time category of the profiling report
+PROFILE_CATEGORIES = {
+    'network_wait': ('llm.generate',),
+    'json_parsing': ('agent.parse_response',),
+    'extraction': ('document.extract',),
+    'serialization': ('serialize',)
+}
+
+
+def _covered_seconds(intervals: List[tuple]) -> float:
+    """Total length of the union of (start, end) intervals"""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def profile_report(root: Span) -> Dict[str, Any]:
+    """
+    Build the stage timeline and wall-time split for a collected trace
+
+    Concurrent spans of the same category are merged, so each category is
+    the wall time during which at least one such span was running.
+    """
+    spans = sorted(root.collected or [], key=lambda s: s.start_time)
+    origin = root.start_time
+    wall = root.duration or 0
+
+    breakdown = {}
+    all_intervals = []
+    for category, names in PROFILE_CATEGORIES.items():
+        intervals = [
+            (s.start_time, s.start_time + (s.duration or 0))
+            for s in spans if s.name in names
+        ]
+        all_intervals.extend(intervals)
+        breakdown[category] = round(_covered_seconds(intervals) * 1000, 3)
+    breakdown['other'] = round(max(0.0, wall - _covered_seconds(all_intervals)) * 1000, 3)
+
+    return {
+        'trace_id': root.trace_id,
+        'wall_ms': round(wall * 1000, 3),
+        'breakdown_ms': breakdown,
+        'timeline': [
+            {
+                'name': s.name,
+                'start_ms': round((s.start_time - origin) * 1000, 3),
+                'duration_ms': round((s.duration or 0) * 1000, 3),
+                'status': s.status,
+                'attributes': s.attributes
+            }
+            for s in spans if s is not root
+        ]
+    }
@@ -0,0 +1,17 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def orchestrator(monkeypatch, tmp_path):
+    """An orchestrator with a dummy API key and no persistent caches"""
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("ENRICHMENT_CACHE_ENABLED", "false")
+    monkeypatch.setenv("ROADMAP_STORE_DIR", str(tmp_path))
+    from orchestrator import RoadmapOrchestrator
+    return RoadmapOrchestrator()
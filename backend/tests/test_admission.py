@@ -0,0 +1,64 @@
+# backend/tests/test_admission.py
+import asyncio
+
+from models.schemas import RequestPriority
+from services.admission import AdmissionController, AdmissionRejected
+
+
+def run_requests(controller, requests):
+    """Start (name, priority) requests in order; each holds its slot briefly"""
+    results = {}
+
+    async def request(name, priority, hold):
+        try:
+            async with controller.slot(priority):
+                await asyncio.sleep(hold)
+            results[name] = 200
+        except AdmissionRejected as e:
+            results[name] = e.status_code
+
+    async def main():
+        tasks = []
+        for name, priority in requests:
+            hold = 0.1 if not tasks else 0.01
+            tasks.append(asyncio.create_task(request(name, priority, hold)))
+            await asyncio.sleep(0.005)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return results
+
+
+def test_interactive_request_displaces_newest_bulk_waiter():
+    controller = AdmissionController(
+        max_concurrent=1,
+        max_queue=2,
+        max_wait_seconds={RequestPriority.INTERACTIVE: 60, RequestPriority.BULK: 60}
+    )
+    results = run_requests(controller, [
+        ('running', RequestPriority.BULK),
+        ('bulk_1', RequestPriority.BULK),
+        ('bulk_2', RequestPriority.BULK),
+        ('interactive', RequestPriority.INTERACTIVE)
+    ])
+
+    assert results == {'running': 200, 'bulk_1': 200, 'bulk_2': 503, 'interactive': 200}
+    assert controller.stats()['shed']['displaced'] == 1
+
+
+def test_request_shed_for_its_wait_does_not_displace_bulk_work():
+    controller = AdmissionController(
+        max_concurrent=1,
+        max_queue=2,
+        max_wait_seconds={RequestPriority.INTERACTIVE: 1, RequestPriority.BULK: 60},
+        initial_service_seconds=30
+    )
+    results = run_requests(controller, [
+        ('running', RequestPriority.BULK),
+        ('bulk_1', RequestPriority.BULK),
+        ('bulk_2', RequestPriority.BULK),
+        ('interactive', RequestPriority.INTERACTIVE)
+    ])
+
+    assert results == {'running': 200, 'bulk_1': 200, 'bulk_2': 200, 'interactive': 429}
+    assert controller.stats()['shed'] == {'queue_full': 0, 'displaced': 0, 'predicted_wait': 1, 'timeout': 0}
@@ -0,0 +1,88 @@
+# backend/tests/test_hedging.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import RequestBudget
+
+
+class FakeStream:
+    """A streamed completion of 20 one-token chunks"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for _ in range(20):
+            time.sleep(self.delay)
+            self.read += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="x"), finish_reason=None)], x_groq=None)
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=""), finish_reason="stop")],
+            x_groq={'usage': {'prompt_tokens': 10, 'completion_tokens': 20}}
+        )
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("LLM_HEDGING_ENABLED", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_SAMPLES", "1")
+    monkeypatch.setenv("LLM_HEDGE_MAX_RATE", "1")
+    from services.llm_service import LLMService
+    service = LLMService()
+    service.hedger._record('agent', 0.02)
+    return service
+
+
+def fake_client(service, delays):
+    """The first call streams slowly, the hedge quickly"""
+    streams = []
+
+    def create(**kwargs):
+        assert kwargs.get('stream') is True
+        streams.append(FakeStream(delays[len(streams)]))
+        return streams[-1]
+
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return streams
+
+
+def test_losing_attempt_is_closed_and_charged_to_the_budget(llm):
+    streams = fake_client(llm, [0.05, 0.0])
+    budget = RequestBudget()
+
+    content, finish_reason = llm.chat([{'role': 'user', 'content': 'p' * 400}], budget=budget, tag='agent', cancellable=False)
+    primary, hedge = streams
+    # The loser is charged from the hedge pool once it has stopped
+    deadline = time.monotonic() + 2
+    while budget.tokens_used == 30 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert (content, finish_reason) == ("x" * 20, "stop")
+    assert hedge.closed and primary.closed
+    assert primary.read < 20
+    stats = llm.stats()
+    assert stats['hedges_won'] == 1
+    # ~100 prompt tokens plus the chunks read before it was abandoned
+    assert stats['wasted_tokens'] >= 100
+    assert budget.tokens_used == 30 + stats['wasted_tokens']
+
+
+def test_non_cancellable_call_survives_a_disconnect(llm):
+    streams = fake_client(llm, [0.0])
+    cancel_event = threading.Event()
+    cancel_event.set()
+    llm.hedger.latencies.clear()
+
+    content, _ = llm.chat([{'role': 'user', 'content': 'p'}], budget=RequestBudget(cancel_event=cancel_event), tag='agent', cancellable=False)
+
+    assert content == "x" * 20
+    assert streams[0].closed
@@ -0,0 +1,121 @@
+# backend/tests/test_incremental.py
+from models.schemas import GenerationProfile
+from services import RequestBudget
+
+
+class FakePrerequisiteDetector:
+    def detect_for_new(self, new_topics, existing_topics, budget=None):
+        return {'prerequisites': {t['topic']: [] for t in new_topics}, 'dependents': {}}
+
+
+class FakeStructureArchitect:
+    def run(self, input_data, budget=None):
+        return {'topics': [
+            {**t, 'id': 'topic_1', 'difficulty_label': 'beginner', 'time_estimate': '1 hour'}
+            for t in input_data['topics']
+        ]}
+
+
+class FakeContentEnricher:
+    def __init__(self):
+        self.enriched = []
+
+    def run(self, input_data, budget=None):
+        self.enriched.extend(t['topic'] for t in input_data['topics'])
+        return {'enriched_topics': [
+            {'topic': t['topic'], 'resources': [{'title': f"{t['topic']} guide"}], 'project_ideas': []}
+            for t in input_data['topics']
+        ]}
+
+
+class FakeValidator:
+    def __init__(self):
+        self.validated = []
+
+    def run(self, input_data, budget=None):
+        self.validated.append(input_data['roadmap'])
+        return {'score': 72, 'passed': False}
+
+
+def make_topic(topic_id, name, concepts):
+    return {
+        'id': topic_id, 'topic': name, 'description': f"About {name}", 'difficulty_label': 'beginner',
+        'category': 'core', 'time_estimate': '1 hour', 'concepts': concepts, 'prerequisites': []
+    }
+
+
+def make_previous():
+    topics = [
+        make_topic('topic_1', 'Alpha', ['a1', 'a2', 'a3']),
+        make_topic('topic_2', 'Beta', ['b1']),
+        make_topic('topic_3', 'Gamma', ['g1'])
+    ]
+    return {
+        'version': 1,
+        'roadmap': {
+            'title': 'T', 'overview': 'O', 'total_time_estimate': '3 hours', 'topics': topics,
+            'dependencies': {'Alpha': [], 'Beta': ['Alpha'], 'Gamma': ['Beta']},
+            'learning_path': ['Alpha', 'Beta', 'Gamma']
+        },
+        'validation_score': 85
+    }
+
+
+def prepare(orchestrator):
+    orchestrator.prerequisite_detector = FakePrerequisiteDetector()
+    orchestrator.structure_architect = FakeStructureArchitect()
+    orchestrator.content_enricher = FakeContentEnricher()
+    orchestrator.validator = FakeValidator()
+    return orchestrator
+
+
+def test_new_topics_never_reuse_removed_ids(orchestrator):
+    prepare(orchestrator)
+    section_topics = [['topic_1'], [{'topic': 'Delta', 'concepts': ['d1']}]]
+
+    result = orchestrator._update_roadmap(make_previous(), section_topics, GenerationProfile.QUALITY, RequestBudget())
+    ids = {t['topic']: t['id'] for t in result['roadmap']['topics']}
+
+    assert ids == {'Alpha': 'topic_1', 'Delta': 'topic_4'}
+    assert result['changes']['removed'] == ['Beta', 'Gamma']
+    assert result['roadmap']['dependencies'] == {'Alpha': [], 'Delta': []}
+
+
+def test_re_extracted_topics_are_refreshed_and_re_enriched(orchestrator):
+    prepare(orchestrator)
+    section_topics = [
+        [{'topic': 'Alpha', 'description': 'Alpha, revised', 'concepts': ['a1', 'a2', 'a4'], 'difficulty_label': 'advanced'}],
+        ['topic_2', 'topic_3']
+    ]
+
+    result = orchestrator._update_roadmap(make_previous(), section_topics, GenerationProfile.QUALITY, RequestBudget())
+    alpha = result['roadmap']['topics'][0]
+
+    assert alpha['id'] == 'topic_1'
+    assert alpha['description'] == 'Alpha, revised'
+    assert alpha['concepts'] == ['a1', 'a2', 'a4']
+    assert alpha['difficulty_label'] == 'advanced'
+    assert alpha['resources'] == [{'title': 'Alpha guide'}]
+    assert orchestrator.content_enricher.enriched == ['Alpha']
+    assert result['changes']['updated'] == ['Alpha']
+
+
+def test_updated_roadmap_is_validated_not_given_the_old_score(orchestrator):
+    prepare(orchestrator)
+    section_topics = [['topic_1'], [{'topic': 'Delta', 'concepts': ['d1']}]]
+
+    result = orchestrator._update_roadmap(make_previous(), section_topics, GenerationProfile.QUALITY, RequestBudget())
+
+    assert result['validation_score'] == 72
+    assert result['iterations'] == 1
+    assert orchestrator.validator.validated == [result['roadmap']]
+
+
+def test_latency_profile_skips_validation(orchestrator):
+    prepare(orchestrator)
+    section_topics = [['topic_1'], [{'topic': 'Delta', 'concepts': ['d1']}]]
+
+    result = orchestrator._update_roadmap(make_previous(), section_topics, GenerationProfile.LATENCY, RequestBudget())
+
+    assert result['validation_score'] == 0
+    assert orchestrator.validator.validated == []
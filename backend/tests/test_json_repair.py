@@ -0,0 +1,99 @@
+# backend/tests/test_json_repair.py
+import pytest
+
+from models.agent_outputs import PrerequisiteOutput, ScoreOutput, TopicListOutput
+from services.json_repair import is_truncated, repair_json, validate_output
+
+
+def test_valid_json_needs_no_repair():
+    assert repair_json('{"topics": [{"topic": "A"}]}') == ({'topics': [{'topic': 'A'}]}, False)
+
+
+def test_prose_and_code_fences_are_ignored():
+    text = 'Here is the roadmap:\n```json\n{"title": "T", "topics": []}\n```\nLet me know!'
+    assert repair_json(text) == ({'title': 'T', 'topics': []}, True)
+
+
+def test_trailing_commas_are_dropped():
+    data, repaired = repair_json('{"topics": [{"topic": "A", "concepts": ["x", "y",],},],}')
+    assert repaired
+    assert data == {'topics': [{'topic': 'A', 'concepts': ['x', 'y']}]}
+
+
+def test_truncation_drops_the_partial_element_of_a_nested_array():
+    text = '{"topics": [{"topic": "A", "concepts": ["x", "y"]}, {"topic": "B", "concepts": ["z", "w'
+    data, repaired = repair_json(text)
+    assert repaired
+    assert data == {'topics': [{'topic': 'A', 'concepts': ['x', 'y']}]}
+
+
+def test_truncated_root_object_keeps_completed_keys():
+    data, _ = repair_json('{"score": 72, "passed": false, "feedback": ["Too sh')
+    assert data == {'score': 72, 'passed': False, 'feedback': []}
+
+
+def test_truncation_after_a_comma_between_elements():
+    data, _ = repair_json('{"learning_path": ["A", "B", ')
+    assert data == {'learning_path': ['A', 'B']}
+
+
+def test_unparseable_text_raises():
+    with pytest.raises(ValueError):
+        repair_json('Sorry, I cannot help with that.')
+
+
+@pytest.mark.parametrize('text, truncated', [
+    ('{"topics": []}', False),
+    ('```json\n{"topics": []}\n```', False),
+    ('{"topics": [{"topic": "A"}', True),
+    ('{"topics": [{"topic": "A', True),
+    ('no json here', False)
+])
+def test_is_truncated(text, truncated):
+    assert is_truncated(text) is truncated
+
+
+@pytest.mark.parametrize('difficulty, expected', [
+    ('medium', 3),
+    ('Hard', 4),
+    ('beginner', 1),
+    ('3/5', 3),
+    (4.4, 4),
+    (5, 5)
+])
+def test_string_difficulties_are_coerced(difficulty, expected):
+    data = validate_output(TopicListOutput, {'topics': [{'topic': 'A', 'difficulty': difficulty}]})
+    assert data == {'topics': [{'topic': 'A', 'difficulty': expected}]}
+
+
+def test_uncoercible_optional_field_is_removed_not_the_topic():
+    data = validate_output(TopicListOutput, {'topics': [
+        {'topic': 'A', 'difficulty': 'N/A', 'concepts': 'variables'},
+        {'topic': 'B', 'resources': 5, 'difficulty_label': 'Easy'}
+    ]})
+    assert data == {'topics': [
+        {'topic': 'A', 'concepts': ['variables']},
+        {'topic': 'B', 'difficulty_label': 'beginner'}
+    ]}
+
+
+def test_items_missing_required_fields_are_dropped():
+    data = validate_output(TopicListOutput, {'topics': [
+        {'topic': 'A'},
+        {'description': 'cut off before its name'},
+        'not a topic',
+        {'topic': 'B'}
+    ]})
+    assert data == {'topics': [{'topic': 'A'}, {'topic': 'B'}]}
+
+
+def test_scores_and_edges_are_coerced():
+    assert validate_output(ScoreOutput, {'score': '78/100', 'feedback': 'Add projects'}) == {
+        'score': 78, 'feedback': ['Add projects']
+    }
+    assert validate_output(PrerequisiteOutput, {'prerequisites': {'B': 'A'}}) == {'prerequisites': {'B': ['A']}}
+
+
+def test_non_object_reply_raises():
+    with pytest.raises(ValueError):
+        validate_output(TopicListOutput, ['A', 'B'])
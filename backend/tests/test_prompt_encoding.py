@@ -0,0 +1,129 @@
+# backend/tests/test_prompt_encoding.py
+import json
+
+import pytest
+
+from services.prompt_encoding import (
+    ELLIPSIS,
+    _ELISION_LEVELS,
+    _missing_ids_and_edges,
+    _render_roadmap,
+    encode_roadmap,
+    estimate_tokens,
+    restore_elided
+)
+
+
+def make_topic(topic_id, name, prerequisites=(), **fields):
+    topic = {
+        'topic': name,
+        'description': f"{name} explained in enough words to be worth shortening. " * 4,
+        'difficulty_label': 'beginner',
+        'category': 'core',
+        'time_estimate': '2 hours',
+        'concepts': [f"{name} concept {i}" for i in range(8)],
+        'prerequisites': list(prerequisites),
+        'resources': [
+            {'type': 'article', 'title': f"{name} guide", 'description': 'Covers the basics, with examples.'}
+        ],
+        'project_ideas': [f"Build something long and detailed with {name}, step by step"] * 3,
+        **fields
+    }
+    if topic_id is not None:
+        topic['id'] = topic_id
+    return topic
+
+
+@pytest.fixture
+def awkward_roadmap():
+    """Names with separators, an outside prerequisite and a topic without an id"""
+    topics = [
+        make_topic('topic_1', 'Variables, Types'),
+        make_topic('topic_2', 'Input | Output', ['Variables, Types', 'Basic algebra, arithmetic']),
+        make_topic(None, 'Loops <- Conditions', ['Input | Output']),
+        make_topic('topic 4', 'Functions', ['Loops <- Conditions', 'Variables, Types'])
+    ]
+    return {
+        'title': 'Intro | Programming',
+        'overview': 'A roadmap, with commas',
+        'total_time_estimate': '4 weeks',
+        'topics': topics,
+        'dependencies': {t['topic']: t['prerequisites'] for t in topics},
+        'learning_path': [t['topic'] for t in topics]
+    }
+
+
+@pytest.mark.parametrize('elision', _ELISION_LEVELS, ids=lambda e: e.name)
+def test_every_elision_level_keeps_ids_and_edges(awkward_roadmap, elision):
+    text = _render_roadmap(awkward_roadmap, elision)
+    assert _missing_ids_and_edges(text, awkward_roadmap) == []
+
+
+def test_separators_in_names_are_quoted(awkward_roadmap):
+    text = encode_roadmap(awkward_roadmap)
+    assert 'topic_2 <- topic_1, "Basic algebra, arithmetic"' in text
+    assert '"Loops <- Conditions" <- topic_2' in text
+    assert '"topic 4" <- "Loops <- Conditions", topic_1' in text
+    assert '"topic 4" | Functions |' in text
+
+
+def test_edges_are_checked_against_the_roadmap(awkward_roadmap):
+    text = encode_roadmap(awkward_roadmap)
+    dropped = text.replace(', "Basic algebra, arithmetic"', '')
+    assert _missing_ids_and_edges(dropped, awkward_roadmap) == ['topic_2 <- Basic algebra, arithmetic']
+
+
+def test_budget_is_respected_without_json_fallback(awkward_roadmap):
+    full = encode_roadmap(awkward_roadmap)
+    budget = estimate_tokens(full) * 2 // 3
+    text = encode_roadmap(awkward_roadmap, budget)
+    assert estimate_tokens(text) <= budget
+    assert not text.startswith('{')
+    assert _missing_ids_and_edges(text, awkward_roadmap) == []
+
+
+def test_unreachable_budget_uses_the_smallest_rendering(awkward_roadmap):
+    text = encode_roadmap(awkward_roadmap, 1)
+    assert text == _render_roadmap(awkward_roadmap, _ELISION_LEVELS[-1])
+    with pytest.raises(ValueError):
+        json.loads(text)
+
+
+def test_restore_elided_puts_back_shortened_content():
+    original = make_topic('topic_2', 'Input | Output', ['Variables, Types'])
+    names = [original['topic'], 'Variables, Types']
+    refined = {
+        'id': 'topic_2',
+        'topic': 'Input | Output',
+        'description': original['description'][:40] + ELLIPSIS,
+        'difficulty_label': 'intermediate',
+        'concepts': original['concepts'][:3],
+        'prerequisites': ['topic_1', 'Basic algebra, arithmetic'],
+        'resources': [{'type': 'article', 'title': 'Input | Output guide'}, {'title': 'New resource'}],
+        'project_ideas': [original['project_ideas'][0][:20] + ELLIPSIS, 'A new project']
+    }
+    restored = restore_elided([original, make_topic('topic_1', names[1])], [refined])[0]
+
+    assert restored['description'] == original['description']
+    assert restored['concepts'] == original['concepts']
+    assert restored['difficulty_label'] == 'intermediate'
+    assert restored['prerequisites'] == ['Variables, Types', 'Basic algebra, arithmetic']
+    assert restored['resources'] == [original['resources'][0], {'title': 'New resource'}]
+    assert restored['project_ideas'] == [original['project_ideas'][0], 'A new project']
+    assert restored['category'] == original['category']
+
+
+def test_restore_elided_keeps_explicit_edits():
+    original = make_topic('topic_1', 'Variables, Types')
+    refined = {'id': 'topic_1', 'description': 'Rewritten.', 'concepts': ['other'], 'project_ideas': []}
+    restored = restore_elided([original], [refined])[0]
+
+    assert restored['topic'] == original['topic']
+    assert restored['description'] == 'Rewritten.'
+    assert restored['concepts'] == ['other']
+    assert restored['project_ideas'] == []
+
+
+def test_restore_elided_passes_through_topics_without_ids():
+    topic = make_topic(None, 'Loops <- Conditions')
+    assert restore_elided([topic], [{'topic': 'Loops <- Conditions'}]) == [{'topic': 'Loops <- Conditions'}]
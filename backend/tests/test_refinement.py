@@ -0,0 +1,107 @@
+# backend/tests/test_refinement.py
+from services import RequestBudget
+
+
+class FakeCritiqueRefiner:
+    """Replays canned critiques and re-scores"""
+
+    def __init__(self, critiques, rescores):
+        self.critiques = iter(critiques)
+        self.rescores = iter(rescores)
+
+    def run(self, input_data, budget=None):
+        return next(self.critiques)
+
+    def rescore(self, *args, budget=None):
+        return next(self.rescores)
+
+
+def make_roadmap():
+    topics = [
+        {'id': 'topic_1', 'topic': 'Variables', 'description': 'Names for values', 'difficulty_label': 'beginner',
+         'category': 'core', 'time_estimate': '1 hour', 'prerequisites': []},
+        {'id': 'topic_2', 'topic': 'Loops', 'description': 'Repetition', 'difficulty_label': 'beginner',
+         'category': 'core', 'time_estimate': '2 hours', 'prerequisites': []},
+        {'id': 'topic_3', 'topic': 'Functions', 'description': 'Reusable code', 'difficulty_label': 'intermediate',
+         'category': 'core', 'time_estimate': '2 hours', 'prerequisites': []}
+    ]
+    return {
+        'title': 'Intro',
+        'overview': 'Basics',
+        'total_time_estimate': '5 hours',
+        'topics': topics,
+        'dependencies': {t['topic']: [] for t in topics},
+        'learning_path': ['Functions', 'Loops', 'Variables']
+    }
+
+
+def test_fixes_given_as_ids_map_back_to_names(orchestrator):
+    roadmap = make_roadmap()
+    orchestrator.critique_refiner = FakeCritiqueRefiner(
+        critiques=[{
+            'score': 60,
+            'topic_fixes': {
+                'topic_3': {'prerequisites': ['topic_1', 'topic_2'], 'difficulty_label': 'Hard'},
+                'topic_2': {'difficulty_label': 'beginner-intermediate'}
+            },
+            'roadmap_fixes': {'learning_path': ['topic_1', 'topic_2', 'topic_3']}
+        }],
+        rescores=[{'score': 90, 'passed': True}]
+    )
+
+    result = orchestrator._fused_refine_loop(roadmap, RequestBudget())
+    refined = result['roadmap']
+    topics = {t['topic']: t for t in refined['topics']}
+
+    assert result['validation_score'] == 90
+    assert refined['dependencies']['Functions'] == ['Variables', 'Loops']
+    assert topics['Functions']['prerequisites'] == ['Variables', 'Loops']
+    assert topics['Functions']['difficulty_label'] == 'advanced'
+    assert topics['Loops']['difficulty_label'] == 'beginner'
+    assert refined['learning_path'] == ['Variables', 'Loops', 'Functions']
+
+
+def test_learning_path_fix_must_cover_every_topic(orchestrator):
+    orchestrator.critique_refiner = FakeCritiqueRefiner(
+        critiques=[{'score': 60, 'roadmap_fixes': {'learning_path': ['topic_1', 'topic_1', 'topic_3']}}],
+        rescores=[{'score': 70}]
+    )
+
+    result = orchestrator._fused_refine_loop(make_roadmap(), RequestBudget())
+
+    assert result['stop_reason'] == 'no_fixes'
+    assert result['roadmap']['learning_path'] == ['Functions', 'Loops', 'Variables']
+
+
+class FakeTopicRefiner:
+    def __init__(self, replies):
+        self.replies = replies
+
+    def run(self, input_data, budget=None):
+        return self.replies[input_data['topic']['id']]
+
+
+def test_refined_topics_are_coerced_before_splicing(orchestrator):
+    from models.serialization import build_response
+
+    orchestrator.topic_refiner = FakeTopicRefiner({
+        'topic_2': {
+            'id': 'topic_9',
+            'topic': 'Renamed',
+            'description': 'Repeating work with for and while',
+            'difficulty_label': 'beginner-intermediate',
+            'time_estimate': 3,
+            'prerequisites': ['Variables', 'topic_3', 'Loops', 'Algebra']
+        }
+    })
+
+    refined = orchestrator._refine_topics(make_roadmap(), {'topic_2': ['Too vague']}, RequestBudget())
+    loops = refined['topics'][1]
+
+    assert loops['id'] == 'topic_2' and loops['topic'] == 'Loops'
+    assert loops['description'] == 'Repeating work with for and while'
+    assert loops['difficulty_label'] == 'beginner'
+    assert loops['time_estimate'] == '3'
+    assert loops['prerequisites'] == ['Variables', 'Functions']
+    assert refined['dependencies']['Loops'] == ['Variables', 'Functions']
+    assert build_response(refined, 80, 1).success
@@ -0,0 +1,204 @@
+# backend/utils/helpers.py
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Iterable, List, Dict, Any, Optional
+import hashlib
+import heapq
+import re
+
+
+def run_parallel(fn: Callable[[Any], Any], items: Iterable[Any], max_workers: int = 4) -> List[Any]:
+    """
+    Run fn over items concurrently in threads
+
+    Returns results in input order. An item whose call raised gets the
+    exception object in its slot so callers can fall back per item. Each
+    call runs in a copy of the caller's context so trace spans nest.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            return e
+
+    if len(items) == 1 or max_workers <= 1:
+        return [call(item) for item in items]
+
+    contexts = [copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(lambda context, item: context.run(call, item), contexts, items))
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a topic/category name for comparisons"""
+    return " ".join(name.lower().replace('-', ' ').replace('_', ' ').split())
+
+
+def jaccard(a: Iterable[Any], b: Iterable[Any]) -> float:
+    """Jaccard similarity of two collections"""
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def topological_order(nodes: List[str], edges: Dict[str, List[str]]) -> List[str]:
+    """
+    Order nodes so that every node comes after its prerequisites
+
+    edges maps a node to its prerequisites. Ties keep the input order and
+    nodes caught in a cycle are appended in input order.
+    """
+    known = set(nodes)
+    position = {node: i for i, node in enumerate(nodes)}
+    remaining = {node: {p for p in edges.get(node, []) if p in known and p != node} for node in nodes}
+    dependents = {node: [] for node in nodes}
+    for node, prereqs in remaining.items():
+        for prereq in prereqs:
+            dependents[prereq].append(node)
+
+    ready_heap = [(position[node], node) for node in nodes if not remaining[node]]
+    heapq.heapify(ready_heap)
+    order = []
+    while ready_heap:
+        _, node = heapq.heappop(ready_heap)
+        order.append(node)
+        for dependent in dependents[node]:
+            remaining[dependent].discard(node)
+            if not remaining[dependent]:
+                heapq.heappush(ready_heap, (position[dependent], dependent))
+
+    placed = set(order)
+    return order + [node for node in nodes if node not in placed]
+
+
+def merge_topics(topic_sets: Iterable[List[Dict[str, Any]]], similarity_threshold: float = 0.8) -> List[Dict[str, Any]]:
+    """
+    Merge topic lists from several documents into one deduplicated list
+
+    Topics are the same if their normalized names match, or if they share a
+    category and their concept sets (of three or more concepts) overlap by at
+    least similarity_threshold.
+    Merged topics keep the first occurrence's fields, the union of concepts
+    and the longest description.
+    """
+    merged: List[Dict[str, Any]] = []
+    by_name: Dict[str, Dict[str, Any]] = {}
+
+    for topics in topic_sets:
+        for topic in topics:
+            name = normalize_name(topic.get('topic', ''))
+            if not name:
+                continue
+            concepts = {normalize_name(c) for c in topic.get('concepts', [])}
+
+            existing = by_name.get(name)
+            # Tiny concept sets overlap by accident, so only compare richer ones
+            if existing is None and len(concepts) >= 3:
+                category = normalize_name(topic.get('category', ''))
+                for candidate in merged:
+                    if normalize_name(candidate.get('category', '')) != category:
+                        continue
+                    candidate_concepts = {normalize_name(c) for c in candidate.get('concepts', [])}
+                    if jaccard(concepts, candidate_concepts) >= similarity_threshold:
+                        existing = candidate
+                        break
+
+            if existing is None:
+                existing = {**topic, 'concepts': list(topic.get('concepts', []))}
+                merged.append(existing)
+            else:
+                known = {normalize_name(c) for c in existing['concepts']}
+                existing['concepts'].extend(c for c in topic.get('concepts', []) if normalize_name(c) not in known)
+                if len(topic.get('description', '')) > len(existing.get('description', '')):
+                    existing['description'] = topic['description']
+            by_name[name] = existing
+
+    return merged
+
+
+def match_topic(
+    topic: Dict[str, Any],
+    candidates: List[Dict[str, Any]],
+    similarity_threshold: float = 0.5
+) -> Optional[Dict[str, Any]]:
+    """
+    Find the candidate describing the same topic, or None
+
+    A normalized name match wins; otherwise the candidate whose concept set
+    (of three or more concepts) overlaps most, if by at least
+    similarity_threshold, so topics renamed by a later stage still match.
+    """
+    name = normalize_name(topic.get('topic', ''))
+    for candidate in candidates:
+        if normalize_name(candidate.get('topic', '')) == name:
+            return candidate
+
+    concepts = {normalize_name(c) for c in topic.get('concepts', [])}
+    if len(concepts) < 3:
+        return None
+    best, best_similarity = None, similarity_threshold
+    for candidate in candidates:
+        similarity = jaccard(concepts, {normalize_name(c) for c in candidate.get('concepts', [])})
+        if similarity >= best_similarity:
+            best, best_similarity = candidate, similarity
+    return best
+
+
+_HEADING_PATTERN = re.compile(
+    r'^(#{1,6}\s+\S|\d+(\.\d+)*[.)]?\s+[A-Z]|(week|chapter|module|unit|lesson|section|part)\s+\d+)',
+    re.IGNORECASE
+)
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 100:
+        return False
+    if _HEADING_PATTERN.match(line):
+        return True
+    return line.isupper() and len(line.split()) <= 8
+
+
+def split_sections(text: str, max_chars: int = 6000) -> List[str]:
+    """
+    Split a document into sections at headings
+
+    Documents without headings fall back to blank-line separated paragraphs
+    grouped up to max_chars. Splitting is deterministic, so an unchanged
+    section produces the same text (and hash) across uploads.
+    """
+    lines = text.splitlines()
+    sections: List[List[str]] = []
+    current: List[str] = []
+
+    if any(_is_heading(line) for line in lines):
+        for line in lines:
+            if _is_heading(line) and any(l.strip() for l in current):
+                sections.append(current)
+                current = []
+            current.append(line)
+        sections.append(current)
+        return [s for s in ("\n".join(section).strip() for section in sections) if s]
+
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    grouped: List[str] = []
+    size = 0
+    for paragraph in paragraphs:
+        if grouped and size + len(paragraph) > max_chars:
+            sections.append(grouped)
+            grouped, size = [], 0
+        grouped.append(paragraph)
+        size += len(paragraph)
+    if grouped:
+        sections.append(grouped)
+    return ["\n\n".join(section) for section in sections]
+
+
+def section_hash(section: str) -> str:
+    """Whitespace-insensitive content hash of a section"""
+    return hashlib.sha1(" ".join(section.split()).encode('utf-8')).hexdigest()